@@ -11,19 +11,26 @@ export default function App() {
   document.title = eventName;
 
   React.useEffect(() => {
-    fetch("/event/data", {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-      },
-      body: JSON.stringify({ event_id: eventid, token: eventToken }),
-    })
-      .then((response) => response.json())
-      .then((json) => {
-        setEventName(json.name);
-        setEventData(json.data);
-      });
-    return;
+    const params = new URLSearchParams({
+      event_id: eventid,
+      token: eventToken,
+    });
+    const source = new EventSource("/event/stream?" + params);
+    source.addEventListener("snapshot", (message) => {
+      const json = JSON.parse(message.data);
+      setEventName(json.name);
+      setEventData(json.data);
+    });
+    source.addEventListener("update", (message) => {
+      const update = JSON.parse(message.data);
+      setEventData((data) => ({
+        players: { ...data.players, ...update.players },
+        games: data.games.map((game) =>
+          game.id === update.game.id ? update.game : game,
+        ),
+      }));
+    });
+    return () => source.close();
   }, []);
 
   if (!eventData) {
@@ -1,8 +1,36 @@
 #!/bin/bash
 export SOFTSERVE_SECRET_KEY=CHANGE_THIS
 #export SOFTSERVE_THINK_TOKEN=CHANGE_THIS
+# Engine workers all /think jobs may use at once (defaults to the CPU count)
+#export SOFTSERVE_THINK_WORKER_BUDGET=8
+#export SOFTSERVE_THINK_MAX_QUEUED_JOBS=100
+# Think results kept for reuse, and for how long in seconds (0 for no limit)
+#export SOFTSERVE_THINK_CACHE_SIZE=10000
+#export SOFTSERVE_THINK_CACHE_TIMEOUT=0
+# Think jobs run in a single API process, which holds this lock; others get 503
+#export SOFTSERVE_THINK_LOCK_FILE=/tmp/softserve-think.lock
 
 export SOFTSERVE_ENGINE=/opt/game/engine/game
+# Keep engine processes running in serve mode instead of starting one per call
+#export SOFTSERVE_ENGINE_POOL_SIZE=4
+#export SOFTSERVE_ENGINE_SERVE_FLAG=-S
+# Engine calls run at once (defaults to the pool size or CPU count), and the
+# number that may queue for a turn before new ones are turned away with a 503
+#export SOFTSERVE_ENGINE_CONCURRENCY=4
+#export SOFTSERVE_ENGINE_MAX_WAITING=64
+# Threads for engine work from async routes (at least the concurrency)
+#export SOFTSERVE_ENGINE_THREADS=4
+# Engine call timeouts (seconds), resource limits, and circuit breaker
+#export SOFTSERVE_ENGINE_TIMEOUT=30
+#export SOFTSERVE_ENGINE_TIMEOUT_ACTIONS=5
+#export SOFTSERVE_ENGINE_CPU_LIMIT=30
+#export SOFTSERVE_ENGINE_MEMORY_LIMIT=1073741824
+#export SOFTSERVE_ENGINE_BREAKER_THRESHOLD=5
+#export SOFTSERVE_ENGINE_BREAKER_COOLDOWN=10
+#export SOFTSERVE_THINK_TIMEOUT=300
+# Entries kept in each process's engine result cache, and Redis timeout (seconds)
+#export SOFTSERVE_ENGINE_CACHE_SIZE=100000
+#export SOFTSERVE_ENGINE_CACHE_TIMEOUT=86400
 
 export SOFTSERVE_STATE_REGEX=[xo\\.]{86}
 
@@ -10,6 +38,17 @@ export SOFTSERVE_UI=/opt/game/ui/
 export SOFTSERVE_UI_PATH=/ui/
 
 export SOFTSERVE_MAX_EVENT_GAMES=1000
+#export SOFTSERVE_REDIS_URL=redis://127.0.0.1:6379
+# Seconds event dashboard data is cached, and a stale copy kept while rebuilding
+#export SOFTSERVE_EVENT_DATA_TIMEOUT=3600
+#export SOFTSERVE_EVENT_DATA_STALE_TIMEOUT=86400
+# Seconds between keepalives on /event/stream, and updates a slow viewer may
+# fall behind by before its stream is closed (its browser then reconnects)
+#export SOFTSERVE_STREAM_KEEPALIVE=15
+#export SOFTSERVE_STREAM_MAX_QUEUED=100
+# Seconds a game handed out by /aivai/play-state is held for that client
+# (defaults to the think time)
+#export SOFTSERVE_CLAIM_TIMEOUT=4.3
 
 export SOFTSERVE_MAIL_HOST="mail.example.com"
 export SOFTSERVE_MAIL_USE_TLS=true
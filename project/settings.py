@@ -73,10 +73,13 @@ DATABASES = {
 }
 
 
+# Also carries live updates to event dashboards (see softserve/updates.py)
+SOFTSERVE_REDIS_URL = environ.get("SOFTSERVE_REDIS_URL", "redis://127.0.0.1:6379")
+
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.redis.RedisCache",
-        "LOCATION": "redis://127.0.0.1:6379",
+        "LOCATION": SOFTSERVE_REDIS_URL,
     }
 }
 
@@ -131,5 +134,18 @@ SERVER_EMAIL = environ.get("SOFTSERVE_MAIL_FROM", "softserve@localhost")
 SOFTSERVE_URL = environ.get("SOFTSERVE_URL", "http://localhost:8000")
 
 SOFTSERVE_THINK_TIME = timedelta(seconds=4.3)
+# How long a game handed to a client waits for it before going to another;
+# after the think time, its move is forfeit anyway
+SOFTSERVE_CLAIM_TIMEOUT = timedelta(
+    seconds=float(
+        environ.get("SOFTSERVE_CLAIM_TIMEOUT", SOFTSERVE_THINK_TIME.total_seconds())
+    )
+)
 SOFTSERVE_INITIAL_STATE = get_initial_state()[0]
 SOFTSERVE_MAX_EVENT_GAMES = int(environ.get("SOFTSERVE_MAX_EVENT_GAMES", 1000))
+# Seconds event data (standings and ratings) is cached for, and a stale copy
+# is kept to serve while the data is rebuilt
+SOFTSERVE_EVENT_DATA_TIMEOUT = int(environ.get("SOFTSERVE_EVENT_DATA_TIMEOUT", 3600))
+SOFTSERVE_EVENT_DATA_STALE_TIMEOUT = int(
+    environ.get("SOFTSERVE_EVENT_DATA_STALE_TIMEOUT", 86400)
+)
@@ -2,7 +2,19 @@ from django.contrib import admin
 
 from .models import *
 
-admin.site.register(Action)
+
+@admin.register(Action)
+class ActionAdmin(admin.ModelAdmin):
+    # There are far too many to list in a select
+    raw_id_fields = ["before", "after"]
+
+
 admin.site.register(Event)
-admin.site.register(Game)
+
+
+@admin.register(Game)
+class GameAdmin(admin.ModelAdmin):
+    raw_id_fields = ["initial", "current", "forfeit", "pending_action"]
+
+
 admin.site.register(Player)
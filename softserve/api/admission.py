@@ -0,0 +1,133 @@
+import asyncio
+from collections import Counter
+from contextlib import contextmanager
+from heapq import heapify, heappop, heappush
+from itertools import count
+from threading import Event, Lock
+
+# Priority classes for engine work; lower goes first
+SUBMIT = 0
+STATE = 1
+THINK = 2
+
+
+class EngineBusy(Exception):
+    pass
+
+
+class Waiter:
+    def __init__(self):
+        self.event = Event()
+        self.shed = False
+
+    def wake(self):
+        self.event.set()
+
+
+class AsyncWaiter:
+    """A waiter in an event loop, which may be woken from any thread"""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+        self.shed = False
+
+    def wake(self):
+        self.loop.call_soon_threadsafe(self.resolve)
+
+    def resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionControl:
+    """Limits how many engine calls run at once
+
+    Calls beyond the limit wait their turn, highest priority first. The
+    wait queue is bounded: when it is full, a new call either displaces the
+    lowest-priority waiter or, if there is none lower than itself, is
+    refused outright. Refused and displaced calls raise EngineBusy.
+
+    Threads wait with acquire(), and coroutines with acquire_async(), in
+    the same queue.
+    """
+
+    def __init__(self, limit, max_waiting):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.running = 0
+        self.waiting = []
+        self.order = count()
+        self.lock = Lock()
+        self.stats = Counter()
+
+    def enqueue(self, priority, waiter):
+        """Take a free slot, returning None, or else queue the waiter"""
+        with self.lock:
+            if self.running < self.limit and not self.waiting:
+                self.running += 1
+                self.stats["admitted"] += 1
+                return None
+
+            if len(self.waiting) >= self.max_waiting:
+                lowest = max(self.waiting) if self.waiting else None
+                if lowest is None or lowest[0] <= priority:
+                    self.stats["rejected"] += 1
+                    raise EngineBusy()
+                self.waiting.remove(lowest)
+                heapify(self.waiting)
+                lowest[2].shed = True
+                lowest[2].wake()
+                self.stats["shed"] += 1
+
+            waiter.entry = (priority, next(self.order), waiter)
+            heappush(self.waiting, waiter.entry)
+            return waiter
+
+    def admitted(self, waiter):
+        if waiter.shed:
+            raise EngineBusy()
+        with self.lock:
+            self.stats["admitted"] += 1
+
+    def acquire(self, priority):
+        waiter = self.enqueue(priority, Waiter())
+        if waiter:
+            waiter.event.wait()
+            self.admitted(waiter)
+
+    async def acquire_async(self, priority):
+        waiter = self.enqueue(priority, AsyncWaiter())
+        if not waiter:
+            return
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self.lock:
+                queued = waiter.entry in self.waiting
+                if queued:
+                    self.waiting.remove(waiter.entry)
+                    heapify(self.waiting)
+            # Woken just as it was cancelled, so it holds a slot to give back
+            if not queued and not waiter.shed:
+                self.release()
+            raise
+        self.admitted(waiter)
+
+    def release(self):
+        with self.lock:
+            if self.waiting:
+                # Hand the slot straight to the next waiter
+                _, _, waiter = heappop(self.waiting)
+                waiter.wake()
+            else:
+                self.running -= 1
+
+    @contextmanager
+    def slot(self, priority):
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
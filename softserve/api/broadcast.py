@@ -0,0 +1,109 @@
+import asyncio
+import json
+import logging
+
+from redis.asyncio import Redis
+
+from ..updates import channel
+
+logger = logging.getLogger(__name__)
+
+
+class Viewer:
+    def __init__(self, max_queued):
+        self.queue = asyncio.Queue(max_queued)
+        # Set once the viewer may have missed an update
+        self.lagging = False
+
+    def drop(self):
+        self.lagging = True
+        if not self.queue.full():
+            # Wake the viewer up
+            self.queue.put_nowait(None)
+
+
+class EventBroadcaster:
+    """Fans out published event updates to the viewers in this process
+
+    The process holds a single Redis subscription per event being watched,
+    however many viewers it has. A viewer that falls more than `max_queued`
+    updates behind, or that may have missed one, is marked as lagging; it
+    should start again from a fresh snapshot.
+    """
+
+    def __init__(self, url, max_queued):
+        self.url = url
+        self.max_queued = max_queued
+        self.pubsub = None
+        self.task = None
+        # Viewers by channel
+        self.viewers = {}
+        # Subscribed channels, each set once Redis confirms the subscription
+        self.subscribed = {}
+
+    async def watch(self, event_id):
+        """Start following an event, returning once its updates will arrive"""
+        name = channel(event_id)
+        viewer = Viewer(self.max_queued)
+        self.viewers.setdefault(name, set()).add(viewer)
+        try:
+            if self.pubsub is None:
+                self.pubsub = Redis.from_url(self.url).pubsub()
+            if name not in self.subscribed:
+                self.subscribed[name] = asyncio.Event()
+                await self.pubsub.subscribe(name)
+                # The listener runs for as long as there are subscriptions
+                if self.task is None or self.task.done():
+                    self.task = asyncio.create_task(self.listen())
+            await self.subscribed[name].wait()
+        except BaseException:
+            self.forget(event_id, viewer)
+            raise
+        return viewer
+
+    def forget(self, event_id, viewer):
+        name = channel(event_id)
+        viewers = self.viewers.get(name, set())
+        viewers.discard(viewer)
+        if not viewers:
+            # The listener unsubscribes
+            self.viewers.pop(name, None)
+
+    async def listen(self):
+        try:
+            while self.subscribed:
+                unwanted = [
+                    name for name in self.subscribed if name not in self.viewers
+                ]
+                if unwanted:
+                    for name in unwanted:
+                        del self.subscribed[name]
+                    await self.pubsub.unsubscribe(*unwanted)
+
+                message = await self.pubsub.get_message(timeout=1)
+                if message:
+                    self.dispatch(message)
+        except Exception:
+            logger.exception("lost event updates")
+            for viewers in self.viewers.values():
+                for viewer in viewers:
+                    viewer.drop()
+            for subscribed in self.subscribed.values():
+                subscribed.set()
+            self.subscribed = {}
+            pubsub, self.pubsub = self.pubsub, None
+            await pubsub.aclose()
+
+    def dispatch(self, message):
+        name = message["channel"].decode()
+        if message["type"] == "subscribe" and name in self.subscribed:
+            self.subscribed[name].set()
+        if message["type"] != "message":
+            return
+
+        update = json.loads(message["data"])
+        for viewer in self.viewers.get(name, ()):
+            try:
+                viewer.queue.put_nowait(update)
+            except asyncio.QueueFull:
+                viewer.lagging = True
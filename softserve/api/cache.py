@@ -0,0 +1,171 @@
+from collections import Counter, OrderedDict
+from hashlib import sha1
+from os import stat
+from threading import Lock
+from time import monotonic, sleep
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class LRUCache:
+    """A thread-safe mapping holding at most `size` recently used items
+
+    If a timeout (in seconds) is given, items also expire that long after
+    they were set.
+    """
+
+    def __init__(self, size, timeout=None):
+        self.size = size
+        self.timeout = timeout
+        self.data = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.data:
+                return None
+            value, expires = self.data[key]
+            if expires and expires < monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = monotonic() + self.timeout if self.timeout else None
+        with self.lock:
+            self.data[key] = (value, expires)
+            self.data.move_to_end(key)
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+
+class EngineCache:
+    """Two-tier cache for the results of deterministic engine commands
+
+    Results are kept in a local LRU cache, backed by Django's shared cache.
+    Keys include the identity of the engine binary, so that results from a
+    replaced engine are never served.
+    """
+
+    # How often (in seconds) to check whether the engine binary has changed
+    CHECK_INTERVAL = 1
+
+    def __init__(self, path, size, timeout, on_change=None):
+        self.path = path
+        self.local = LRUCache(size)
+        self.timeout = timeout
+        self.on_change = on_change
+        self.stats = Counter()
+        self.lock = Lock()
+        self.identity = None
+        self.checked = 0
+
+    def engine_identity(self):
+        now = monotonic()
+        if self.identity and now - self.checked < self.CHECK_INTERVAL:
+            return self.identity
+
+        try:
+            st = stat(self.path)
+            fingerprint = f"{self.path}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+        except OSError:
+            fingerprint = self.path
+        identity = sha1(fingerprint.encode()).hexdigest()[:16]
+
+        with self.lock:
+            self.checked = now
+            if identity == self.identity:
+                return identity
+            changed = self.identity is not None
+            self.identity = identity
+            if changed:
+                self.stats["invalidations"] += 1
+
+        if changed:
+            self.local.clear()
+            if self.on_change:
+                self.on_change()
+
+        return identity
+
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def shared_key(self, identity, args):
+        digest = sha1(json.dumps(args).encode()).hexdigest()
+        return f"engine:{identity}:{digest}"
+
+    def get(self, args):
+        identity = self.engine_identity()
+        key = (identity,) + tuple(args)
+
+        value = self.local.get(key)
+        if value is not None:
+            self.count("local_hits")
+            return value
+
+        # The engine is used while Django loads its settings, before the
+        # shared cache can be
+        if settings.configured:
+            try:
+                value = cache.get(self.shared_key(identity, args))
+            except Exception:
+                value = None
+            if value is not None:
+                self.count("shared_hits")
+                self.local.set(key, value)
+                return value
+
+        self.count("misses")
+        return None
+
+    def set(self, args, value):
+        identity = self.engine_identity()
+        self.local.set((identity,) + tuple(args), value)
+
+        if settings.configured:
+            try:
+                cache.set(self.shared_key(identity, args), value, timeout=self.timeout)
+            except Exception:
+                pass
+
+
+def get_or_build(
+    key, build, timeout, stale_key=None, stale_timeout=None, build_timeout=30
+):
+    """Get a value from Django's cache, building it in one place at a time
+
+    While one caller builds a missing value, the others wait for it. If a
+    `stale_key` is given, the last value built is also kept under it, and
+    served instead of waiting. Should the builder fail or die, another
+    takes over (after up to `build_timeout` seconds, if it died).
+    """
+    value = cache.get(key)
+    while value is None:
+        if cache.add(f"{key}:building", True, build_timeout):
+            try:
+                value = build()
+                cache.set(key, value, timeout)
+                if stale_key:
+                    cache.set(stale_key, value, stale_timeout)
+            finally:
+                cache.delete(f"{key}:building")
+            return value
+
+        if stale_key:
+            value = cache.get(stale_key)
+        if value is None:
+            sleep(0.05)
+            value = cache.get(key)
+    return value
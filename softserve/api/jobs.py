@@ -0,0 +1,260 @@
+import asyncio
+import fcntl
+from collections import OrderedDict
+from os import getpid
+from subprocess import PIPE
+from uuid import uuid4
+
+from .cache import LRUCache
+from .limits import limit
+from .util import (
+    ENGINE,
+    ENGINE_MEMORY_LIMIT,
+    apply_action_async,
+    engine_cache,
+    engine_stats,
+)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class ThinkUnavailable(Exception):
+    pass
+
+
+class ThinkJob:
+    """A request for the engine to choose an action for a state"""
+
+    def __init__(self, state, workers, iterations):
+        self.id = uuid4().hex
+        self.state = state
+        self.workers = workers
+        self.iterations = iterations
+
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        # HTTP status describing the error, if any
+        self.error_status = None
+        self.process = None
+        self.task = None
+        self.done = asyncio.Event()
+
+    @property
+    def finished(self):
+        return self.status in [DONE, FAILED, CANCELLED]
+
+
+class ThinkScheduler:
+    """Runs think jobs in order, keeping the engine workers in use within budget
+
+    Jobs and their results live in memory, in the event loop of the process
+    that accepted them. Results are also cached by state, and a job is
+    answered from the cache if an earlier search of its state went at least
+    as deep.
+
+    So the budget holds, only one process may run jobs: given a
+    `lock_path`, the first to take a job locks that file for as long as it
+    runs, and other processes are refused with ThinkUnavailable.
+    """
+
+    def __init__(
+        self,
+        budget,
+        max_queued,
+        max_finished=1000,
+        cache_size=10000,
+        cache_timeout=None,
+        timeout=None,
+        lock_path=None,
+    ):
+        self.budget = budget
+        self.timeout = timeout
+        self.lock_path = lock_path
+        self.lock_file = None
+        self.pid = None
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.results = LRUCache(cache_size, cache_timeout)
+
+        self.in_use = 0
+        self.queue = []
+        self.jobs = {}
+        self.finished = OrderedDict()
+
+    @property
+    def full(self):
+        return len(self.queue) >= self.max_queued
+
+    def claim(self):
+        """Make sure this is the process that runs think jobs"""
+        # A forked child has to take the lock for itself
+        if not self.lock_path or self.pid == getpid():
+            return
+
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise ThinkUnavailable("think jobs are run by another process")
+        self.lock_file = lock_file
+        self.pid = getpid()
+
+    def submit(self, state, workers, iterations):
+        self.claim()
+
+        # A job bigger than the whole budget would never start
+        job = ThinkJob(state, min(workers, self.budget), iterations)
+        self.jobs[job.id] = job
+
+        cached = self.results.get(self.result_key(state))
+        if cached and cached["iterations"] >= iterations:
+            job.result = dict(cached, cached=True)
+            job.status = DONE
+            self.retire(job)
+            return job
+
+        self.queue.append(job)
+        self.schedule()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def position(self, job):
+        """Number of jobs queued ahead of this one, if it is queued"""
+        if job.status != QUEUED:
+            return None
+        return self.queue.index(job)
+
+    def schedule(self):
+        # Strictly first come, first served, so big jobs aren't starved
+        while self.queue and self.in_use + self.queue[0].workers <= self.budget:
+            job = self.queue.pop(0)
+            job.status = RUNNING
+            self.in_use += job.workers
+            job.task = asyncio.create_task(self.run(job))
+
+    async def run(self, job):
+        shutdown = False
+        try:
+            await self.think(job)
+        except asyncio.CancelledError:
+            # The event loop itself is going away
+            shutdown = True
+            job.status = CANCELLED
+            raise
+        except Exception as e:
+            job.error = getattr(e, "detail", None) or str(e)
+            job.error_status = getattr(e, "status_code", None)
+            job.status = FAILED
+        finally:
+            if job.process and job.process.returncode is None:
+                job.process.kill()
+            job.process = None
+            self.in_use -= job.workers
+            self.retire(job)
+            if not shutdown:
+                self.schedule()
+
+    async def think(self, job):
+        job.process = await asyncio.create_subprocess_exec(
+            ENGINE,
+            "-w",
+            str(job.workers),
+            "-i",
+            str(job.iterations),
+            "-t",
+            job.state,
+            stdout=PIPE,
+            stderr=PIPE,
+        )
+        limit(
+            job.process.pid,
+            # Each worker is a thread using its own share of CPU time
+            int(self.timeout * job.workers) if self.timeout else None,
+            ENGINE_MEMORY_LIMIT,
+        )
+        if job.status == CANCELLED:
+            job.process.kill()
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                job.process.communicate(), self.timeout
+            )
+        except asyncio.TimeoutError:
+            engine_stats["timeouts"] += 1
+            job.error = "engine timed out"
+            job.error_status = 504
+            job.status = FAILED
+            return
+
+        if job.status == CANCELLED:
+            return
+        if job.process.returncode < 0:
+            engine_stats["crashes"] += 1
+            job.error = "engine crashed"
+            job.error_status = 502
+            job.status = FAILED
+            return
+        if job.process.returncode:
+            job.error = stderr.decode().strip()
+            job.status = FAILED
+            return
+
+        action = stdout.decode().strip()
+        result = await apply_action_async(job.state, action)
+        result = {
+            "action": action,
+            "state": result.state,
+            "actions": result.actions,
+            "log": stderr.decode().strip(),
+            "iterations": job.iterations,
+            "cached": False,
+        }
+
+        # Still worth keeping, even if the job was cancelled meanwhile
+        key = self.result_key(job.state)
+        cached = self.results.get(key)
+        if not cached or cached["iterations"] <= job.iterations:
+            self.results.set(key, result)
+
+        if job.status != CANCELLED:
+            job.result = result
+            job.status = DONE
+
+    def result_key(self, state):
+        # Results from an old engine binary shouldn't be reused
+        return (engine_cache.engine_identity(), state)
+
+    def cancel(self, job):
+        if job.finished:
+            return
+
+        if job.status == QUEUED:
+            self.queue.remove(job)
+            job.status = CANCELLED
+            self.retire(job)
+            return
+
+        job.status = CANCELLED
+        if job.process and job.process.returncode is None:
+            job.process.kill()
+
+    def retire(self, job):
+        """Mark a job finished, forgetting the oldest finished jobs if needed"""
+        job.done.set()
+        self.finished[job.id] = job
+        while len(self.finished) > self.max_finished:
+            old_id, _ = self.finished.popitem(last=False)
+            del self.jobs[old_id]
+
+    async def wait(self, job, timeout=None):
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,104 @@
+"""Guards against a misbehaving engine"""
+
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic
+import resource
+
+
+class EngineTimeout(Exception):
+    pass
+
+
+class EngineCrash(Exception):
+    pass
+
+
+class EngineUnavailable(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"engine unavailable; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def limit(pid, cpu_seconds=None, memory_bytes=None):
+    """Limit the CPU time and memory of a child process that has just started
+
+    This is done from the parent, rather than in a preexec_fn, which is
+    unsafe in a threaded process and keeps subprocess from using vfork.
+    """
+    try:
+        if cpu_seconds:
+            resource.prlimit(pid, resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+        if memory_bytes:
+            resource.prlimit(pid, resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    except ProcessLookupError:
+        # It has already finished
+        pass
+
+
+class CircuitBreaker:
+    """Fails fast once the engine has failed too many times in a row
+
+    After `threshold` consecutive failures the breaker opens, and calls are
+    refused for `cooldown` seconds. After that a single trial call is let
+    through: if it succeeds the breaker closes again, otherwise it stays open
+    for another cooldown.
+    """
+
+    def __init__(self, threshold, cooldown, stats):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.stats = stats
+        self.failures = 0
+        self.opened = None
+        self.trial = False
+        self.lock = Lock()
+
+    @contextmanager
+    def guard(self):
+        """Run a call through the breaker, which sees how the call ends
+
+        Only EngineCrash and EngineTimeout count as failures; other errors
+        count as neither failure nor success.
+        """
+        trial = self.check()
+        try:
+            yield
+        except (EngineCrash, EngineTimeout):
+            self.failed()
+            raise
+        else:
+            self.succeeded()
+        finally:
+            if trial:
+                with self.lock:
+                    self.trial = False
+
+    def check(self):
+        """Raise EngineUnavailable if open, returning whether this is the trial"""
+        with self.lock:
+            if self.opened is None:
+                return False
+
+            remaining = self.opened + self.cooldown - monotonic()
+            if remaining > 0 or self.trial:
+                self.stats["fast_failures"] += 1
+                raise EngineUnavailable(max(remaining, 1))
+
+            self.trial = True
+            return True
+
+    def succeeded(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+            self.trial = False
+
+    def failed(self):
+        with self.lock:
+            self.failures += 1
+            self.trial = False
+            if self.failures >= self.threshold:
+                if self.opened is None:
+                    self.stats["breaker_trips"] += 1
+                self.opened = monotonic()
@@ -0,0 +1,170 @@
+"""Long-lived engine processes
+
+Rather than starting the engine once per call, a pool keeps a number of
+engine processes running in serve mode, talking to each over a simple line
+protocol on stdin and stdout:
+
+- Each request is a single line of JSON: a list of commands, each command
+  being the list of arguments it would take on the command line (e.g.
+  `[["-l", state], ["-W", state]]`). In place of an argument, a command may
+  give `{"ref": n}`, meaning the (stripped) stdout of the request's nth
+  command; this lets dependent commands share a single round trip (e.g.
+  `[["-a", action, state], ["-W", {"ref": 0}]]`).
+- Each response is a single line of JSON: a list of results, one per command
+  run, each of the form `{"status": 0, "stdout": "...", "stderr": "..."}`.
+  The worker stops running a request's commands after the first one with a
+  nonzero status.
+"""
+
+import json
+from os import getpid
+from select import select
+from subprocess import PIPE, Popen
+from threading import Condition, Lock
+
+
+class EngineWorkerError(Exception):
+    pass
+
+
+class EngineWorkerTimeout(EngineWorkerError):
+    pass
+
+
+class EngineWorker:
+    def __init__(self, command):
+        self.process = Popen(
+            command, stdin=PIPE, stdout=PIPE, encoding="utf-8", bufsize=1
+        )
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def request(self, commands, timeout=None):
+        try:
+            self.process.stdin.write(json.dumps(commands) + "\n")
+            self.process.stdin.flush()
+            ready, _, _ = select([self.process.stdout], [], [], timeout)
+            if not ready:
+                raise EngineWorkerTimeout(f"no response in {timeout}s")
+            line = self.process.stdout.readline()
+        except (BrokenPipeError, OSError, ValueError) as e:
+            raise EngineWorkerError(e)
+
+        if not line:
+            raise EngineWorkerError("engine worker exited")
+
+        try:
+            results = json.loads(line)
+        except ValueError:
+            raise EngineWorkerError(f"bad response from engine worker: {line!r}")
+
+        return results
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+
+    def close(self):
+        if not self.alive:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=1)
+        except Exception:
+            self.process.kill()
+            self.process.wait()
+
+
+class EnginePool:
+    """A fixed-size pool of engine workers, started on demand"""
+
+    def __init__(self, command, size, on_start=None):
+        self.command = command
+        self.size = size
+        # Called with the pid of each new worker, e.g. to limit its resources
+        self.on_start = on_start
+        self.lock = Lock()
+        # Notified whenever a worker is checked in or discarded
+        self.available = Condition(self.lock)
+        self.reset()
+
+    def reset(self):
+        self.pid = getpid()
+        # Most recently used last
+        self.idle = []
+        self.started = 0
+        self.generation = 0
+
+    def checkout(self):
+        with self.available:
+            # Workers belong to the process that started them; a forked
+            # child needs its own
+            if self.pid != getpid():
+                self.reset()
+
+            # Wait for an idle worker, or room to start one
+            while not self.idle and self.started >= self.size:
+                self.available.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.started += 1
+
+        try:
+            worker = EngineWorker(self.command)
+        except OSError as e:
+            self.discard(None)
+            raise EngineWorkerError(e)
+        if self.on_start:
+            self.on_start(worker.process.pid)
+        worker.generation = self.generation
+        return worker
+
+    def checkin(self, worker):
+        with self.available:
+            if worker.generation == self.generation:
+                self.idle.append(worker)
+                self.available.notify()
+                return
+        self.discard(worker)
+
+    def discard(self, worker):
+        """Drop a broken worker, so that a fresh one is started in its place"""
+        if worker:
+            worker.close()
+        with self.available:
+            self.started -= 1
+            self.available.notify()
+
+    def request(self, commands, timeout=None):
+        worker = self.checkout()
+        if not worker.alive:
+            self.discard(worker)
+            worker = self.checkout()
+
+        try:
+            results = worker.request(commands, timeout)
+        except EngineWorkerError:
+            # A worker that timed out may still be busy, so don't reuse it
+            worker.kill()
+            self.discard(worker)
+            raise
+
+        self.checkin(worker)
+        return results
+
+    def close(self):
+        with self.lock:
+            while self.idle:
+                self.idle.pop().close()
+            self.started = 0
+
+    def restart(self):
+        """Replace all workers, e.g. after the engine binary has changed"""
+        with self.available:
+            self.generation += 1
+            while self.idle:
+                self.idle.pop().close()
+                self.started -= 1
+            self.available.notify_all()
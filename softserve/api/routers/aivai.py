@@ -4,12 +4,28 @@ from uuid import uuid4
 
 from fastapi import APIRouter, HTTPException
 from django.contrib.auth import authenticate
+from django.db import connection
 
+from ...exceptions import SoftserveException
 from ...models import Action, Event, Game, Player, AUTO_CREATE_EVENTS
 from ..schema import *
-from ..util import engine, get_actions
+from ..admission import SUBMIT
+from ..util import apply_action, engine_priority, get_actions, in_background
 
-router = APIRouter(prefix="/aivai", tags=["aivai"])
+router = APIRouter(
+    prefix="/aivai", tags=["aivai"], dependencies=[engine_priority(SUBMIT)]
+)
+
+
+def store_legal_actions(action_id, state):
+    """Store a pending action's legal actions, to check its submission against"""
+    try:
+        actions, _ = get_actions(state)
+        Action.objects.filter(pk=action_id, legal_actions__isnull=True).update(
+            legal_actions=actions
+        )
+    finally:
+        connection.close()
 
 
 @router.post(
@@ -24,6 +40,14 @@ Your POST must contain a JSON object with two fields:
 - `player`: an identifier for your client
 - `token`: your authentication token
 
+Each game is handed to one client at a time. If you run several clients
+for one player, or might retry a request whose response was lost, also
+send:
+- `client`: an id of your choosing, different for each client
+
+A client that sends the same `client` again gets back the game it was
+already handed, if its move is still to be submitted.
+
 If the event is `mirror`, your client will play games against itself--the
 output from one `/aivai/submit-action` will become the next
 `/aivai/play-state`, with new games being started as necessary.
@@ -33,6 +57,15 @@ with the action_id, to `/aivai/submit-action`.
 
 The state is independent and may be completely unrelated to states given
 in previous and subsequent calls.
+
+The response includes the game's `history`: every state so far, starting
+from the initial state. To save resending states your client already has,
+you can also send:
+- `history_game_id`: the `game_id` of a game whose history you hold
+- `history_length`: how many of that game's states you hold
+
+If the game returned is that game, `history` then only holds the states
+after those, and `history_start` gives the index of the first one.
 """,
 )
 def aivai_play_state(req: AIvAIPlayState) -> AIvAIPlayStateResponse:
@@ -43,7 +76,7 @@ def aivai_play_state(req: AIvAIPlayState) -> AIvAIPlayStateResponse:
 
     if req.event == "*":
         # Get any event
-        game = Event.objects.find_any_game_for(user)
+        game = Event.objects.claim_any_game_for(user, req.client)
     else:
         # Get requested event
         if req.event in AUTO_CREATE_EVENTS:
@@ -55,7 +88,7 @@ def aivai_play_state(req: AIvAIPlayState) -> AIvAIPlayStateResponse:
                 raise HTTPException(status_code=404, detail="event not found")
 
         # Find a game in the event for the player
-        game = event.find_game_for(user)
+        game = event.claim_game_for(user, req.client)
 
     if game == None:
         raise HTTPException(
@@ -65,11 +98,21 @@ def aivai_play_state(req: AIvAIPlayState) -> AIvAIPlayStateResponse:
     # Create a pending action on the game
     action = game.next_action()
 
+    # Work out the legal actions while the client thinks
+    if action.legal_actions is None:
+        in_background(SUBMIT, store_legal_actions, action.id, action.before_state)
+
+    # Only send the part of the history the client doesn't have yet
+    history_start = 0
+    if req.history_game_id == game.id and req.history_length:
+        history_start = min(req.history_length, game.history_length)
+
     return AIvAIPlayStateResponse(
         state=action.before_state,
         action_id=action.id,
         game_id=game.id,
-        history=game.history,
+        history=game.history_since(history_start),
+        history_start=history_start,
     )
 
 
@@ -93,51 +136,48 @@ def aivai_submit_action(req: AIvAISubmitAction) -> AIvAISubmitActionResponse:
     # Grab the submit timestamp right away
     now = datetime.now()
 
-    # Get user
-    user = authenticate(username=req.player, password=req.token)
-    if not user:
-        raise HTTPException(status_code=403, detail="invalid credentials")
-
-    # Get action
+    # Get action, along with its player and game
     try:
-        action = Action.objects.get(pk=req.action_id)
+        action = Action.objects.for_submit().get(pk=req.action_id)
     except Action.DoesNotExist:
-        raise HTTPException(status_code=404, detail="action_id not found")
-
-    if action.player.user != user:
+        action = None
+
+    # Checking the password against the action's user saves looking the
+    # user up separately; otherwise, work out what's wrong
+    user = action.player.user if action else None
+    if not (
+        user
+        and user.username == req.player
+        and user.is_active
+        and user.check_password(req.token)
+    ):
+        user = authenticate(username=req.player, password=req.token)
+        if not user:
+            raise HTTPException(status_code=403, detail="invalid credentials")
+        if not action:
+            raise HTTPException(status_code=404, detail="action_id not found")
         raise HTTPException(status_code=401, detail="player-action_id mismatch")
 
     # Ensure action hasn't been already submitted
     if action.submit_timestamp:
         raise HTTPException(status_code=401, detail="action has already been submitted")
 
-    # Check action submission
-    state = action.before_state
-    actions, _ = get_actions(state)
-    if req.action not in actions:
+    # Check and play the action (legal_actions is normally stored by now)
+    result = apply_action(action.before_state, req.action, action.legal_actions)
+    if not result.valid:
         raise HTTPException(status_code=422, detail="invalid action")
 
-    # Update action
-    stdout, _ = engine(f"-a", req.action, state)
-    action.notation = req.action
-    action.after_state = stdout.strip()
-    action.submit_timestamp = now
-    action.save()
-
-    # Check if state is terminal
-    game = action.game
-    stdout, _ = engine("-W", action.after_state)
-    winner = stdout.strip()
-    if winner in ["x", "o", "draw"] or game.threefold_repetition:
-        game.end_timestamp = now
-        game.save()
-        if winner == "x":
-            player = game.player_set.get(number=0)
-            player.winner = True
-            player.save()
-        if winner == "o":
-            player = game.player_set.get(number=1)
-            player.winner = True
-            player.save()
+    # Update the action, and the game along with it, in one transaction
+    winner = result.winner
+    try:
+        action.submit(
+            req.action,
+            result.state,
+            now,
+            finished=winner in ["x", "o", "draw"],
+            winner={"x": 0, "o": 1}.get(winner),
+        )
+    except SoftserveException:
+        raise HTTPException(status_code=401, detail="action has already been submitted")
 
     return AIvAISubmitActionResponse(winner=winner)
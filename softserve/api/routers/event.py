@@ -1,19 +1,31 @@
+import asyncio
+import json
+from os import environ
+
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.cache import cache
 from django.db import IntegrityError
+from django.db.models import OuterRef, Subquery
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
 from ...exceptions import SoftserveException
-from ...models import Event, Player
+from ...models import Event, GameResult, Player, Standing
+from ..broadcast import EventBroadcaster
+from ..cache import get_or_build
 from ..schema import *
-
-from collections import Counter
+from .ratings import cached_ratings
 
 router = APIRouter(prefix="/event", tags=["event"])
 
 
-EVENT_DATA_CACHE_TIMEOUT = 20
+# Seconds between keepalive comments on an idle stream
+STREAM_KEEPALIVE = float(environ.get("SOFTSERVE_STREAM_KEEPALIVE", 15))
+# Updates a viewer may fall behind by before its stream is closed
+STREAM_MAX_QUEUED = int(environ.get("SOFTSERVE_STREAM_MAX_QUEUED", 100))
+
+broadcaster = EventBroadcaster(settings.SOFTSERVE_REDIS_URL, STREAM_MAX_QUEUED)
 
 
 @router.post(
@@ -86,71 +98,155 @@ you'll need the token included as part of the URL in the email.
 """,
 )
 def event_data(req: EventData) -> EventDataResponse:
+    event = get_event(req.event_id, req.token)
+
+    data = cached_event_data(event, req.forfeits, stale=True)
+
+    return EventDataResponse(name=event.name, data=data)
+
+
+@router.post(
+    "/ratings",
+    response_model=EventRatingsResponse,
+    summary="Get player ratings for an event",
+    description="""
+Bradley-Terry ratings for an event's players, on the Elo scale, with
+approximate 95% confidence intervals. These account for who has played
+whom, which the win and loss counts from `/event/data` do not. See
+`/ratings` for details.
+
+This takes the same token as `/event/data`.
+""",
+)
+def event_ratings(req: EventRatings) -> EventRatingsResponse:
+    event = get_event(req.event_id, req.token)
+    ratings = cached_ratings(event.id, event.game_set.all())
+    return EventRatingsResponse(name=event.name, ratings=ratings)
+
+
+@router.get(
+    "/stream",
+    summary="Stream live data for an event",
+    description="""
+A [server-sent event](https://html.spec.whatwg.org/multipage/server-sent-events.html)
+stream of an event's data, taking the same parameters as `/event/data`.
+
+The first message, a `snapshot`, holds what `/event/data` would return.
+Each `update` after that holds a game that has just finished, in the same
+form as the games in the snapshot, and the new standings of its players;
+they replace the game and players in the snapshot.
+
+The stream is closed if the viewer falls behind. Browsers reconnect by
+themselves, starting again from a new snapshot.
+""",
+)
+async def event_stream(
+    event_id: int, token: str, forfeits: bool = True
+) -> StreamingResponse:
+    event = await run_in_threadpool(get_event, event_id, token)
+    # Follow updates before taking the snapshot, so none are missed; any
+    # that are already in the snapshot do no harm, as they replace rather
+    # than add to what the viewer has
+    viewer = await broadcaster.watch(event.id)
+
+    async def stream():
+        try:
+            # Not stale, or it could predate updates already missed
+            data = await run_in_threadpool(cached_event_data, event, forfeits)
+            yield server_sent("snapshot", {"name": event.name, "data": data})
+
+            while not viewer.lagging:
+                try:
+                    update = await asyncio.wait_for(
+                        viewer.queue.get(), STREAM_KEEPALIVE
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if update is not None:
+                    yield server_sent("update", view_update(update, forfeits))
+        finally:
+            broadcaster.forget(event.id, viewer)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def get_event(event_id, token):
     try:
-        event = Event.objects.get(pk=req.event_id)
+        event = Event.objects.get(pk=event_id)
     except Event.DoesNotExist:
         raise HTTPException(status_code=404, detail="event not found")
 
-    if req.token != event.dashboard_token:
+    if token != event.dashboard_token:
         raise HTTPException(
             status_code=403,
             detail=f"invalid token",
         )
 
-    cache_key = f"event:{event.id}:data"
-    cached_data = cache.get(cache_key)
-    if cached_data:
-        return EventDataResponse(name=event.name, data=cached_data)
+    return event
+
+
+def server_sent(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+def view_update(update, forfeits):
+    """Pick out the view of a published update that a viewer asked for"""
+    game = {key: update["game"][key] for key in ["id", "x", "y"]}
+    game["result"] = update["game"]["forfeit_result" if forfeits else "result"]
+    return {
+        "game": game,
+        "players": {
+            username: counts
+            for username, counted_forfeits, counts in update["standings"]
+            if counted_forfeits == bool(forfeits)
+        },
+    }
 
+
+def cached_event_data(event, forfeits, stale=False):
+    """The event's data, cached until it changes
+
+    Only one request at a time builds the data; others wait, or with
+    `stale` set are given the last data built.
+    """
+    forfeits = bool(forfeits)
+    version = Event.data_version(event.id)
+    return get_or_build(
+        f"event:{event.id}:data:{version}:{forfeits}",
+        lambda: build_event_data(event, forfeits),
+        settings.SOFTSERVE_EVENT_DATA_TIMEOUT,
+        f"event:{event.id}:data:{forfeits}" if stale else None,
+        settings.SOFTSERVE_EVENT_DATA_STALE_TIMEOUT,
+    )
+
+
+def build_event_data(event, forfeits):
+    """Read an event's standings and game results, in two queries"""
     data = {}
     data["players"] = {}
     data["games"] = []
 
-    games = event.game_set.all()
-    for game in games:
-        game_data = {}
-        game_data["id"] = game.id
-        data["games"].append(game_data)
-
-        game_data["x"] = game.player_name(0)
-        game_data["y"] = game.player_name(1)
-
-        for player in game.player_set.all():
-            player_name = player.name()
-
-            if player_name not in data["players"]:
-                data["players"][player_name] = Counter()
-
-            if not game.end_timestamp:
-                data["players"][player_name]["ongoing"] += 1
-                game_data["result"] = "ongoing"
-                continue
-
-            if req.forfeits:
-                forfeit = game.forfeit
-                if forfeit:
-                    if player == forfeit:
-                        data["players"][player_name]["forfeit_losses"] += 1
-                        if player_name == game_data["x"]:
-                            game_data["result"] = "x forfeit"
-                        if player_name == game_data["y"]:
-                            game_data["result"] = "y forfeit"
-                    else:
-                        data["players"][player_name]["forfeit_wins"] += 1
-                    continue
-
-            if player.winner:
-                data["players"][player_name]["wins"] += 1
-                if player_name == game_data["x"]:
-                    game_data["result"] = "x win"
-                if player_name == game_data["y"]:
-                    game_data["result"] = "y win"
-            elif player.opponent.winner:
-                data["players"][player_name]["losses"] += 1
-            else:
-                data["players"][player_name]["draws"] += 1
-                game_data["result"] = "draw"
-
-    cache.set(cache_key, data, timeout=30)
+    standings = Standing.objects.filter(
+        event=event, forfeits=bool(forfeits)
+    ).select_related("user")
+    for standing in standings:
+        data["players"][standing.user.username] = standing.counts()
+
+    players = Player.objects.filter(game=OuterRef("game")).values("user__username")
+    results = (
+        GameResult.objects.filter(event=event)
+        .annotate(
+            x=Subquery(players.filter(number=0)), y=Subquery(players.filter(number=1))
+        )
+        .order_by("game")
+        .values_list("game", "x", "y", "forfeit_result" if forfeits else "result")
+    )
+    for game_id, x, y, result in results:
+        data["games"].append({"id": game_id, "x": x, "y": y, "result": result})
 
-    return EventDataResponse(name=event.name, data=data)
+    return data
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.cache import cache
+from fastapi import APIRouter
+
+from ...models import Event, Game
+from ...ratings import rate
+from ..cache import get_or_build
+from ..schema import *
+
+router = APIRouter(prefix="/ratings", tags=["ratings"])
+
+
+@router.get(
+    "",
+    response_model=RatingsResponse,
+    summary="Get player ratings across all events",
+    description="""
+Bradley-Terry ratings, on the Elo scale, fitted to every finished game
+between two different players. Draws count as half a win for each.
+
+Each rating comes with an approximate 95% confidence interval, from `low`
+to `high`. The ratings are refitted as games finish.
+""",
+)
+def ratings_all() -> RatingsResponse:
+    return RatingsResponse(ratings=cached_ratings("*", Game.objects.all()))
+
+
+def cached_ratings(event_id, games):
+    """Ratings for an event's games ("*" for all), cached until one ends
+
+    Each fit starts from the last one, so it only has far to go for the
+    players of games that have finished since.
+    """
+    version = Event.data_version(event_id)
+    strengths_key = f"event:{event_id}:strengths"
+
+    def build():
+        ratings, strengths = rate(games, cache.get(strengths_key))
+        cache.set(strengths_key, strengths, settings.SOFTSERVE_EVENT_DATA_STALE_TIMEOUT)
+        return ratings
+
+    return get_or_build(
+        f"event:{event_id}:ratings:{version}",
+        build,
+        settings.SOFTSERVE_EVENT_DATA_TIMEOUT,
+        f"event:{event_id}:ratings",
+        settings.SOFTSERVE_EVENT_DATA_STALE_TIMEOUT,
+    )
@@ -1,17 +1,32 @@
 from os import environ
 from typing import Annotated
+import re
 
 from fastapi import APIRouter, Header, HTTPException, Path
 
+from ..admission import STATE
 from ..schema import *
-from ..util import engine, get_actions, get_initial_state, SoftserveException
+from ..util import (
+    engine_priority,
+    apply_action_async,
+    engine_async,
+    engine_many_async,
+    get_actions_async,
+    parse_actions,
+    get_initial_state_async,
+    SoftserveException,
+)
 
 STATE_REGEX = environ.get("SOFTSERVE_STATE_REGEX")
 if not STATE_REGEX:
     raise SoftserveException("No state regex defined!")
 
+MAX_BATCH_QUERIES = int(environ.get("SOFTSERVE_MAX_BATCH_QUERIES", 1000))
+
 
-router = APIRouter(prefix="/state", tags=["state"])
+router = APIRouter(
+    prefix="/state", tags=["state"], dependencies=[engine_priority(STATE)]
+)
 
 
 @router.get(
@@ -23,7 +38,7 @@ Returns a serialized representation of the initial game state.
 """,
 )
 async def state_initial() -> StateInitialResponse:
-    state, stderr = get_initial_state()
+    state, stderr = await get_initial_state_async()
     return StateInitialResponse(state=state, log=stderr)
 
 
@@ -39,7 +54,7 @@ issue](https://github.com/harding-university/softserve/issues).
 """,
 )
 async def state_actions(state: str = Path(pattern=STATE_REGEX)) -> StateActionsResponse:
-    actions, stderr = get_actions(state)
+    actions, stderr = await get_actions_async(state)
     return StateActionsResponse(actions=actions, log=stderr)
 
 
@@ -59,14 +74,11 @@ issue](https://github.com/harding-university/softserve/issues).
 async def state_act(
     state: str = Path(pattern=STATE_REGEX), action: str = Path()
 ) -> StateActResponse:
-    actions, stderr = get_actions(state)
-    if action not in actions:
+    result = await apply_action_async(state, action)
+    if not result.valid:
         raise HTTPException(status_code=422, detail="invalid action")
 
-    stdout, stderr = engine("-a", action, state)
-    after = stdout.strip()
-    actions, _ = get_actions(after)
-    return StateActResponse(state=after, actions=actions, log=stderr)
+    return StateActResponse(state=result.state, actions=result.actions, log=result.log)
 
 
 @router.get(
@@ -85,5 +97,78 @@ issue](https://github.com/harding-university/softserve/issues).
 """,
 )
 async def state_winner(state: str = Path(pattern=STATE_REGEX)) -> StateWinnerResponse:
-    stdout, stderr = engine("-W", state)
+    stdout, stderr = await engine_async("-W", state)
     return StateWinnerResponse(winner=stdout.strip(), log=stderr)
+
+
+@router.post(
+    "/batch",
+    response_model=StateBatchResponse,
+    summary="Run many state queries at once",
+    description=f"""
+Answers a list of queries in one request, which is much faster than
+calling the endpoints above one at a time.
+
+Your POST must contain a JSON object with a `queries` field, a list of
+objects with the following fields:
+- `op`: `actions`, `act`, or `winner`, matching the endpoints above
+- `state`: the state to query
+- `action`: the action to play (only for `act`)
+
+The response has a `results` list, in the same order as the queries.
+Each result has the fields the matching endpoint would return, or an
+`error` field if the query failed (e.g. `invalid action`).
+
+At most {MAX_BATCH_QUERIES} queries may be sent at once.
+""",
+)
+async def state_batch(req: StateBatch) -> StateBatchResponse:
+    if len(req.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=422, detail="too many queries")
+    for i, query in enumerate(req.queries):
+        if not re.search(STATE_REGEX, query.state):
+            raise HTTPException(status_code=422, detail=f"invalid state in query {i}")
+        if query.op == "act" and query.action is None:
+            raise HTTPException(status_code=422, detail=f"no action in query {i}")
+
+    # First, everything that only needs the given state
+    commands = [
+        ["-W" if query.op == "winner" else "-l", query.state] for query in req.queries
+    ]
+    results = []
+    for query, (status, stdout, stderr) in zip(
+        req.queries, await engine_many_async(commands)
+    ):
+        if status:
+            results.append(StateQueryResult(error=stderr, log=stderr))
+        elif query.op == "winner":
+            results.append(StateQueryResult(winner=stdout, log=stderr))
+        elif query.op == "actions":
+            results.append(StateQueryResult(actions=parse_actions(stdout), log=stderr))
+        elif query.action not in parse_actions(stdout):
+            results.append(StateQueryResult(error="invalid action", log=stderr))
+        else:
+            results.append(None)
+
+    # Then play the valid actions, and list actions from the resulting states
+    acts = [i for i, result in enumerate(results) if result is None]
+    played = await engine_many_async(
+        [["-a", req.queries[i].action, req.queries[i].state] for i in acts]
+    )
+    for i, (status, _, stderr) in zip(acts, played):
+        if status:
+            results[i] = StateQueryResult(error=stderr, log=stderr)
+
+    acts = [
+        (i, after, log) for i, (_, after, log) in zip(acts, played) if not results[i]
+    ]
+    listed = await engine_many_async([["-l", after] for _, after, _ in acts])
+    for (i, after, log), (status, stdout, stderr) in zip(acts, listed):
+        if status:
+            results[i] = StateQueryResult(error=stderr, log=stderr)
+        else:
+            results[i] = StateQueryResult(
+                state=after, actions=parse_actions(stdout), log=log
+            )
+
+    return StateBatchResponse(results=results)
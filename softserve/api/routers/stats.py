@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+
+from ..schema import *
+from ..util import admission, breaker, engine_cache, engine_stats, pool
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+
+@router.get("/engine", response_model=EngineStatsResponse, include_in_schema=False)
+def stats_engine() -> EngineStatsResponse:
+    return EngineStatsResponse(
+        engine=dict(
+            engine_stats,
+            pool_size=pool.size if pool else 0,
+            pool_workers=pool.started if pool else 0,
+        ),
+        cache=dict(engine_cache.stats, local_size=len(engine_cache.local)),
+        admission=dict(
+            admission.stats,
+            running=admission.running,
+            waiting=len(admission.waiting),
+        ),
+        breaker_open=breaker.opened is not None,
+    )
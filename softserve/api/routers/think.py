@@ -1,9 +1,13 @@
-from os import environ
+from os import cpu_count, environ
+from os.path import join
+from tempfile import gettempdir
 
 from fastapi import APIRouter, HTTPException, Path
 
+from ..admission import THINK
+from ..jobs import DONE, ThinkScheduler, ThinkUnavailable
 from ..schema import *
-from ..util import engine, get_actions, get_initial_state, SoftserveException
+from ..util import SoftserveException, engine_priority
 
 THINK_TOKEN = environ.get("SOFTSERVE_THINK_TOKEN")
 
@@ -13,48 +17,144 @@ MAX_WORKERS = 4
 MIN_ITERATIONS = 1000
 MAX_ITERATIONS = 500000
 
+# Total engine workers that all running think jobs may use at once
+WORKER_BUDGET = int(environ.get("SOFTSERVE_THINK_WORKER_BUDGET", cpu_count() or 1))
+MAX_QUEUED_JOBS = int(environ.get("SOFTSERVE_THINK_MAX_QUEUED_JOBS", 100))
+# Longest a /think/job call may wait for its job to finish, in seconds
+MAX_JOB_WAIT = 60
+# Think results kept for reuse, and for how long (in seconds; 0 for no limit)
+CACHE_SIZE = int(environ.get("SOFTSERVE_THINK_CACHE_SIZE", 10000))
+CACHE_TIMEOUT = int(environ.get("SOFTSERVE_THINK_CACHE_TIMEOUT", 0))
+# Seconds a think job may run before it is killed
+TIMEOUT = float(environ.get("SOFTSERVE_THINK_TIMEOUT", 300))
+# Jobs and the worker budget live in one process's memory, so only the API
+# process holding this lock runs them; run the API as a single process
+LOCK_FILE = environ.get(
+    "SOFTSERVE_THINK_LOCK_FILE", join(gettempdir(), "softserve-think.lock")
+)
+
 STATE_REGEX = environ.get("SOFTSERVE_STATE_REGEX")
 if not STATE_REGEX:
     raise SoftserveException("No state regex defined!")
 
 
-router = APIRouter(prefix="/think", tags=["think"])
-
+router = APIRouter(
+    prefix="/think", tags=["think"], dependencies=[engine_priority(THINK)]
+)
 
-@router.post(
-    "/action/{state}", response_model=ThinkActionResponse, include_in_schema=False
+scheduler = ThinkScheduler(
+    WORKER_BUDGET,
+    MAX_QUEUED_JOBS,
+    cache_size=CACHE_SIZE,
+    cache_timeout=CACHE_TIMEOUT or None,
+    timeout=TIMEOUT,
+    lock_path=LOCK_FILE,
 )
-async def think_action(
-    req: ThinkAction, state: str = Path(pattern=STATE_REGEX)
-) -> ThinkActionResponse:
-    if not req.token:
+
+
+def check_token(token):
+    if not token:
         raise HTTPException(status_code=403, detail="think token required")
-    if req.token != THINK_TOKEN:
+    if token != THINK_TOKEN:
         raise HTTPException(status_code=403, detail="invalid think token")
 
+
+def submit_job(req, state):
     workers = min(int(req.workers), MAX_WORKERS)
     workers = max(workers, MIN_WORKERS)
 
     iterations = min(int(req.iterations), MAX_ITERATIONS)
     iterations = max(iterations, MIN_ITERATIONS)
 
-    action, stderr = engine("-w", str(workers), "-i", str(iterations), "-t", state)
-    after, _ = engine("-a", action, state)
-    actions, _ = get_actions(after)
+    if scheduler.full:
+        raise HTTPException(
+            status_code=503,
+            detail="think queue is full; please try again",
+            headers={"Retry-After": "1"},
+        )
+
+    try:
+        return scheduler.submit(state, workers, iterations)
+    except ThinkUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+def job_response(job):
+    return ThinkJobResponse(
+        job_id=job.id,
+        status=job.status,
+        position=scheduler.position(job),
+        result=ThinkActionResponse(**job.result) if job.result else None,
+        error=job.error,
+    )
 
-    return ThinkActionResponse(action=action, state=after, actions=actions, log=stderr)
+
+@router.post(
+    "/action/{state}", response_model=ThinkActionResponse, include_in_schema=False
+)
+async def think_action(
+    req: ThinkAction, state: str = Path(pattern=STATE_REGEX)
+) -> ThinkActionResponse:
+    check_token(req.token)
+
+    job = submit_job(req, state)
+    await scheduler.wait(job)
+
+    if job.status != DONE:
+        raise HTTPException(
+            status_code=job.error_status or 422, detail=job.error or job.status
+        )
+
+    return ThinkActionResponse(**job.result)
+
+
+@router.post("/jobs/{state}", response_model=ThinkJobResponse, include_in_schema=False)
+async def think_job_submit(
+    req: ThinkAction, state: str = Path(pattern=STATE_REGEX)
+) -> ThinkJobResponse:
+    check_token(req.token)
+    return job_response(submit_job(req, state))
+
+
+@router.post("/job/{job_id}", response_model=ThinkJobResponse, include_in_schema=False)
+async def think_job(req: ThinkJobQuery, job_id: str) -> ThinkJobResponse:
+    check_token(req.token)
+
+    job = scheduler.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="job not found")
+
+    if req.wait:
+        await scheduler.wait(job, min(req.wait, MAX_JOB_WAIT))
+
+    return job_response(job)
+
+
+@router.post(
+    "/job/{job_id}/cancel", response_model=ThinkJobResponse, include_in_schema=False
+)
+async def think_job_cancel(req: ThinkJobCancel, job_id: str) -> ThinkJobResponse:
+    check_token(req.token)
+
+    job = scheduler.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="job not found")
+
+    scheduler.cancel(job)
+    return job_response(job)
 
 
 @router.post("/limits")
 async def think_limits(req: ThinkLimits) -> ThinkLimitsResponse:
-    if not req.token:
-        raise HTTPException(status_code=403, detail="think token required")
-    if req.token != THINK_TOKEN:
-        raise HTTPException(status_code=403, detail="invalid think token")
+    check_token(req.token)
 
     return ThinkLimitsResponse(
         min_iterations=MIN_ITERATIONS,
         max_iterations=MAX_ITERATIONS,
         min_workers=MIN_WORKERS,
         max_workers=MAX_WORKERS,
+        worker_budget=scheduler.budget,
+        workers_in_use=scheduler.in_use,
+        queued_jobs=len(scheduler.queue),
+        max_queued_jobs=scheduler.max_queued,
     )
@@ -1,12 +1,17 @@
-from typing import List, Mapping
+from typing import List, Literal, Mapping
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class AIvAIPlayState(BaseModel):
     event: str
     player: str
     token: str
+    # Chosen by the client, so its retries get back the game it was handed
+    client: str = Field("", max_length=64)
+    # The game, and how much of its history, the client already holds
+    history_game_id: int | None = None
+    history_length: int | None = Field(None, ge=0)
 
 
 class AIvAIPlayStateResponse(BaseModel):
@@ -14,6 +19,8 @@ class AIvAIPlayStateResponse(BaseModel):
     state: str
     game_id: int
     history: List[str]
+    # Index in the full history of the first state in history
+    history_start: int = 0
 
 
 class AIvAISubmitAction(BaseModel):
@@ -31,6 +38,13 @@ class EngineResponse(BaseModel):
     log: str
 
 
+class EngineStatsResponse(BaseModel):
+    engine: Mapping[str, int]
+    cache: Mapping[str, int]
+    admission: Mapping[str, int]
+    breaker_open: bool
+
+
 class EventCreate(BaseModel):
     name: str | None = None
     players: List[str]
@@ -53,6 +67,29 @@ class EventDataResponse(BaseModel):
     data: Mapping[str, Mapping[str, Mapping[str, int]] | List[Mapping[str, int | str]]]
 
 
+class Rating(BaseModel):
+    player: str
+    rating: float
+    # Approximate 95% confidence interval
+    low: float
+    high: float
+    games: int
+
+
+class RatingsResponse(BaseModel):
+    ratings: List[Rating]
+
+
+class EventRatings(BaseModel):
+    event_id: int
+    token: str
+
+
+class EventRatingsResponse(BaseModel):
+    name: str
+    ratings: List[Rating]
+
+
 class GameData(BaseModel):
     game_id: int
     token: str
@@ -109,6 +146,26 @@ class ThinkAction(BaseModel):
 class ThinkActionResponse(StateActionsResponse):
     action: str
     state: str
+    # Depth of the search the action came from, which may be from the cache
+    iterations: int
+    cached: bool
+
+
+class ThinkJobQuery(BaseModel):
+    token: str
+    wait: float | None = 0
+
+
+class ThinkJobResponse(BaseModel):
+    job_id: str
+    status: str
+    position: int | None = None
+    result: ThinkActionResponse | None = None
+    error: str | None = None
+
+
+class ThinkJobCancel(BaseModel):
+    token: str
 
 
 class ThinkLimits(BaseModel):
@@ -120,7 +177,32 @@ class ThinkLimitsResponse(BaseModel):
     max_iterations: int
     min_workers: int
     max_workers: int
+    worker_budget: int
+    workers_in_use: int
+    queued_jobs: int
+    max_queued_jobs: int
 
 
 class StateWinnerResponse(EngineResponse):
     winner: str
+
+
+class StateQuery(BaseModel):
+    op: Literal["actions", "act", "winner"]
+    state: str
+    action: str | None = None
+
+
+class StateBatch(BaseModel):
+    queries: List[StateQuery]
+
+
+class StateQueryResult(EngineResponse):
+    state: str | None = None
+    actions: List[str] | None = None
+    winner: str | None = None
+    error: str | None = None
+
+
+class StateBatchResponse(BaseModel):
+    results: List[StateQueryResult]
@@ -1,7 +1,26 @@
-from os import environ
-from subprocess import run
+import asyncio
+import atexit
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from contextvars import Context, ContextVar, copy_context
+from os import cpu_count, environ
+from shutil import which
+from subprocess import PIPE, Popen, TimeoutExpired
+from typing import NamedTuple
 
-from fastapi import HTTPException
+from fastapi import Depends, HTTPException
+
+from .admission import STATE, AdmissionControl, EngineBusy
+from .cache import EngineCache
+from .limits import (
+    CircuitBreaker,
+    EngineCrash,
+    EngineTimeout,
+    EngineUnavailable,
+    limit,
+)
+from .pool import EnginePool, EngineWorkerError, EngineWorkerTimeout
 
 
 class SoftserveException(Exception):
@@ -12,25 +31,351 @@ ENGINE = environ.get("SOFTSERVE_ENGINE")
 if not ENGINE:
     raise SoftserveException("No engine defined!")
 
+# Number of long-lived engine workers; 0 starts the engine once per call
+ENGINE_POOL_SIZE = int(environ.get("SOFTSERVE_ENGINE_POOL_SIZE", 0))
+# Argument that puts the engine in serve mode (see pool.py for the protocol)
+ENGINE_SERVE_FLAG = environ.get("SOFTSERVE_ENGINE_SERVE_FLAG", "-S")
+
+# Seconds each kind of engine command may run before it is killed
+ENGINE_TIMEOUT = float(environ.get("SOFTSERVE_ENGINE_TIMEOUT", 30))
+ENGINE_TIMEOUTS = {
+    "-I": float(environ.get("SOFTSERVE_ENGINE_TIMEOUT_INITIAL", 10)),
+    "-l": float(environ.get("SOFTSERVE_ENGINE_TIMEOUT_ACTIONS", 5)),
+    "-a": float(environ.get("SOFTSERVE_ENGINE_TIMEOUT_ACT", 5)),
+    "-W": float(environ.get("SOFTSERVE_ENGINE_TIMEOUT_WINNER", 5)),
+}
+# CPU seconds per call and bytes of memory an engine process may use
+ENGINE_CPU_LIMIT = int(environ.get("SOFTSERVE_ENGINE_CPU_LIMIT", 30))
+ENGINE_MEMORY_LIMIT = int(environ.get("SOFTSERVE_ENGINE_MEMORY_LIMIT", 2**30))
+# Consecutive crashes or timeouts before failing fast, and for how many seconds
+ENGINE_BREAKER_THRESHOLD = int(environ.get("SOFTSERVE_ENGINE_BREAKER_THRESHOLD", 5))
+ENGINE_BREAKER_COOLDOWN = float(environ.get("SOFTSERVE_ENGINE_BREAKER_COOLDOWN", 10))
+
+engine_stats = Counter()
+breaker = CircuitBreaker(
+    ENGINE_BREAKER_THRESHOLD, ENGINE_BREAKER_COOLDOWN, engine_stats
+)
+
+pool = None
+if ENGINE_POOL_SIZE > 0:
+    # Workers live on, so only their memory is limited
+    pool = EnginePool(
+        [ENGINE, ENGINE_SERVE_FLAG],
+        ENGINE_POOL_SIZE,
+        on_start=lambda pid: limit(pid, memory_bytes=ENGINE_MEMORY_LIMIT),
+    )
+    atexit.register(pool.close)
+
+# Engine calls allowed to run at once, and to wait for a turn
+ENGINE_CONCURRENCY = int(
+    environ.get("SOFTSERVE_ENGINE_CONCURRENCY", ENGINE_POOL_SIZE or cpu_count() or 1)
+)
+ENGINE_MAX_WAITING = int(environ.get("SOFTSERVE_ENGINE_MAX_WAITING", 64))
+# Seconds a client is told to wait before retrying when the engine is busy
+ENGINE_RETRY_AFTER = 1
+
+admission = AdmissionControl(ENGINE_CONCURRENCY, ENGINE_MAX_WAITING)
+
+# Threads available to async callers for engine work. Only in_executor()
+# submits to them, admitting each call before it reaches a thread, so more
+# than ENGINE_CONCURRENCY would never be used, and fewer would leave
+# admitted calls queued.
+ENGINE_THREADS = int(environ.get("SOFTSERVE_ENGINE_THREADS", ENGINE_CONCURRENCY))
+_executor = ThreadPoolExecutor(
+    max_workers=max(ENGINE_THREADS, ENGINE_CONCURRENCY), thread_name_prefix="engine"
+)
+# Threads for in_background(), whose work waits for admission on the thread
+# itself, so it must never hold up work admitted beforehand
+_background = ThreadPoolExecutor(
+    max_workers=ENGINE_CONCURRENCY, thread_name_prefix="engine-background"
+)
+
+# Priority class (see admission.py) of the engine calls made by the
+# current request; routers set it with engine_priority()
+current_priority = ContextVar("current_priority", default=STATE)
+# Set while running work that in_executor() has already admitted
+admitted = ContextVar("admitted", default=False)
+
+
+def engine_priority(priority):
+    async def set_priority():
+        current_priority.set(priority)
+
+    return Depends(set_priority)
+
+
+# Results of these engine commands depend only on their arguments
+CACHED_FLAGS = ["-l", "-a", "-W"]
+ENGINE_CACHE_SIZE = int(environ.get("SOFTSERVE_ENGINE_CACHE_SIZE", 100000))
+ENGINE_CACHE_TIMEOUT = int(environ.get("SOFTSERVE_ENGINE_CACHE_TIMEOUT", 86400))
+
+engine_cache = EngineCache(
+    which(ENGINE) or ENGINE,
+    ENGINE_CACHE_SIZE,
+    ENGINE_CACHE_TIMEOUT,
+    on_change=pool.restart if pool else None,
+)
+
+
+def run_engine(commands: list[list[str]]) -> list[(int, str, str)]:
+    """Run engine commands, returning (status, stdout, stderr) for each
+
+    Commands are run in order, stopping after the first that fails. They are
+    sent to a pooled worker if there is one, falling back to starting the
+    engine for each command if not.
+    """
+    if admitted.get():
+        slot = nullcontext()
+    else:
+        slot = admission.slot(current_priority.get())
+
+    try:
+        # Only check the breaker once admitted, so a trial call can't be
+        # turned away after taking the trial
+        with slot, breaker.guard():
+            return run_commands(commands)
+    except EngineBusy:
+        raise engine_busy()
+    except EngineUnavailable as e:
+        raise HTTPException(
+            status_code=503,
+            detail="engine unavailable; please try again",
+            headers={"Retry-After": str(round(e.retry_after))},
+        )
+    except EngineTimeout:
+        raise HTTPException(status_code=504, detail="engine timed out")
+    except EngineCrash:
+        raise HTTPException(status_code=502, detail="engine crashed")
+
+
+def engine_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="engine busy; please try again",
+        headers={"Retry-After": str(ENGINE_RETRY_AFTER)},
+    )
+
+
+def command_timeout(args) -> float:
+    return ENGINE_TIMEOUTS.get(args[0], ENGINE_TIMEOUT)
+
+
+def run_commands(commands: list[list[str]]) -> list[(int, str, str)]:
+    if pool:
+        try:
+            results = pool.request(
+                commands, sum(command_timeout(args) for args in commands)
+            )
+            return [(r["status"], r["stdout"], r["stderr"]) for r in results]
+        except EngineWorkerTimeout:
+            engine_stats["timeouts"] += 1
+            raise EngineTimeout()
+        except EngineWorkerError:
+            # Fall back to a fresh engine process
+            engine_stats["worker_crashes"] += 1
+
+    results = []
+    for args in commands:
+        args = [
+            results[arg["ref"]][1].strip() if isinstance(arg, dict) else arg
+            for arg in args
+        ]
+        with Popen([ENGINE] + args, stdout=PIPE, stderr=PIPE, encoding="utf-8") as p:
+            limit(p.pid, ENGINE_CPU_LIMIT, ENGINE_MEMORY_LIMIT)
+            try:
+                stdout, stderr = p.communicate(timeout=command_timeout(args))
+            except TimeoutExpired:
+                p.kill()
+                engine_stats["timeouts"] += 1
+                raise EngineTimeout()
+        # Killed by a signal, e.g. a segfault or hitting a resource limit
+        if p.returncode < 0:
+            engine_stats["crashes"] += 1
+            raise EngineCrash()
+        results.append((p.returncode, stdout, stderr))
+        if p.returncode:
+            break
+    return results
+
 
 def engine(*args) -> (str, str):
-    p = run([ENGINE] + list(args), capture_output=True, encoding="utf-8")
+    cacheable = args[0] in CACHED_FLAGS
+    if cacheable:
+        cached = engine_cache.get(args)
+        if cached:
+            return cached
 
-    if p.returncode:
-        raise HTTPException(status_code=422, detail=p.stderr)
+    [(status, stdout, stderr)] = run_engine([list(args)])
 
-    return p.stdout.strip(), p.stderr.strip()
+    if status:
+        raise HTTPException(status_code=422, detail=stderr)
 
+    result = stdout.strip(), stderr.strip()
+    if cacheable:
+        engine_cache.set(args, result)
+    return result
 
-def get_actions(state: str) -> (list[str], str):
-    stdout, stderr = engine("-l", state)
 
+def engine_many(commands: list[list[str]]) -> list[(int, str, str)]:
+    """Run independent engine commands, returning (status, stdout, stderr) for each
+
+    Uncached commands go to the engine together, carrying on past any that
+    fail. Together means one round trip with the engine pool; without it,
+    the engine is still started for each command.
+    """
+    results = {}
+    uncached = []
+    for i, args in enumerate(commands):
+        cached = args[0] in CACHED_FLAGS and engine_cache.get(tuple(args))
+        if cached:
+            results[i] = (0,) + cached
+        else:
+            uncached.append(i)
+
+    ran = []
+    while len(ran) < len(uncached):
+        ran += run_engine([commands[i] for i in uncached[len(ran) :]])
+
+    for i, (status, stdout, stderr) in zip(uncached, ran):
+        results[i] = (status, stdout.strip(), stderr.strip())
+        if not status and commands[i][0] in CACHED_FLAGS:
+            engine_cache.set(tuple(commands[i]), results[i][1:])
+
+    return [results[i] for i in range(len(commands))]
+
+
+def parse_actions(stdout: str) -> list[str]:
     if stdout.strip() == "terminal state":
-        return ([], stderr)
+        return []
+
+    return stdout.strip().split("\n")
+
 
-    return (stdout.strip().split("\n"), stderr)
+def get_actions(state: str) -> (list[str], str):
+    stdout, stderr = engine("-l", state)
+    return (parse_actions(stdout), stderr)
 
 
 def get_initial_state() -> str:
     stdout, stderr = engine("-I")
     return stdout.strip(), stderr
+
+
+class ActionResult(NamedTuple):
+    valid: bool
+    state: str
+    winner: str
+    actions: list[str]
+    log: str
+
+
+def apply_action(
+    state: str, action: str, legal_actions: list[str] | None = None
+) -> ActionResult:
+    """Check and play an action, then evaluate the resulting state
+
+    This takes a single engine request, rather than one per step, and none
+    at all if every step is cached. That request is one round trip only with
+    the engine pool (SOFTSERVE_ENGINE_POOL_SIZE, off by default); otherwise
+    the engine is started for each step. If the legal actions from the state
+    are already known, they can be passed in to skip listing them.
+    """
+    log = ""
+    if legal_actions is None:
+        listed = engine_cache.get(("-l", state))
+        if listed:
+            legal_actions = parse_actions(listed[0])
+            log = listed[1]
+    if legal_actions is not None and action not in legal_actions:
+        return ActionResult(False, "", "", [], log)
+
+    played = engine_cache.get(("-a", action, state))
+    if legal_actions is not None and played:
+        after, log = played
+        winner = engine_cache.get(("-W", after))
+        actions = engine_cache.get(("-l", after))
+        if winner and actions:
+            return ActionResult(True, after, winner[0], parse_actions(actions[0]), log)
+
+    commands = []
+    if legal_actions is None:
+        commands.append(["-l", state])
+    after_ref = {"ref": len(commands)}
+    commands += [["-a", action, state], ["-W", after_ref], ["-l", after_ref]]
+    results = run_engine(commands)
+
+    if legal_actions is None:
+        status, stdout, stderr = results.pop(0)
+        if status:
+            raise HTTPException(status_code=422, detail=stderr)
+        engine_cache.set(("-l", state), (stdout.strip(), stderr.strip()))
+        if action not in parse_actions(stdout):
+            return ActionResult(False, "", "", [], stderr.strip())
+
+    for status, _, stderr in results:
+        if status:
+            raise HTTPException(status_code=422, detail=stderr)
+
+    after = results[0][1].strip()
+    outputs = [(stdout.strip(), stderr.strip()) for _, stdout, stderr in results]
+    for args, output in zip(
+        [("-a", action, state), ("-W", after), ("-l", after)], outputs
+    ):
+        engine_cache.set(args, output)
+
+    (_, log), (winner, _), (actions, _) = outputs
+    return ActionResult(True, after, winner, parse_actions(actions), log)
+
+
+async def in_executor(func, *args):
+    """Run a blocking engine helper without blocking the event loop
+
+    The helper waits for admission here, in the event loop, and holds its
+    slot until it finishes in the executor.
+    """
+    try:
+        await admission.acquire_async(current_priority.get())
+    except EngineBusy:
+        raise engine_busy()
+
+    context = copy_context()
+    context.run(admitted.set, True)
+    try:
+        future = _executor.submit(context.run, func, *args)
+    except BaseException:
+        admission.release()
+        raise
+    # Not released when the caller is cancelled, as the helper carries on
+    future.add_done_callback(lambda _: admission.release())
+    return await asyncio.wrap_future(future)
+
+
+def in_background(priority, func, *args):
+    """Start a blocking engine helper without waiting for it to finish
+
+    The helper's engine calls are admitted at the given priority, as the
+    request context isn't carried over. Any error is ignored.
+    """
+    context = Context()
+    context.run(current_priority.set, priority)
+    return _background.submit(context.run, func, *args)
+
+
+async def engine_async(*args) -> (str, str):
+    return await in_executor(engine, *args)
+
+
+async def engine_many_async(commands: list[list[str]]) -> list[(int, str, str)]:
+    return await in_executor(engine_many, commands)
+
+
+async def get_actions_async(state: str) -> (list[str], str):
+    return await in_executor(get_actions, state)
+
+
+async def get_initial_state_async() -> str:
+    return await in_executor(get_initial_state)
+
+
+async def apply_action_async(state: str, action: str) -> ActionResult:
+    return await in_executor(apply_action, state, action)
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from softserve.models import Event, GameResult, Standing, tally_games
+
+
+def rebuild(event):
+    """Recompute an event's standings and game results from its games"""
+    with transaction.atomic():
+        # Games can't finish, nor standings change, until this is done
+        results, totals = tally_games(
+            event.game_set.select_for_update().prefetch_related("player_set")
+        )
+        list(Standing.objects.select_for_update().filter(event=event).only("id"))
+
+        GameResult.objects.filter(event=event).delete()
+        Standing.objects.filter(event=event).delete()
+        GameResult.objects.bulk_create(results)
+        Standing.objects.bulk_create(
+            Standing(
+                event=event,
+                user_id=user_id,
+                forfeits=forfeits,
+                **{count: counts[count] for count in Standing.COUNTS},
+            )
+            for (user_id, forfeits), counts in totals.items()
+        )
+    Event.bump_data_version(event.id)
+
+
+class Command(BaseCommand):
+    help = "Rebuild event standings and game results from the games played"
+
+    def add_arguments(self, parser):
+        parser.add_argument("events", nargs="*", help="event names (default: all)")
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        if options["events"]:
+            events = events.filter(name__in=options["events"])
+
+        for event in events:
+            rebuild(event)
+            self.stdout.write(f"Rebuilt {event}")
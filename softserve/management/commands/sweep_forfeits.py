@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from softserve.models import Game
+
+
+class Command(BaseCommand):
+    help = "Record forfeits for pending actions that have run out of think time"
+
+    def handle(self, *args, **options):
+        now = datetime.now()
+        overdue = Game.objects.filter(
+            status=Game.Status.ONGOING,
+            forfeit=None,
+            pending_action__create_timestamp__lt=now - settings.SOFTSERVE_THINK_TIME,
+        ).select_related("pending_action")
+
+        swept = 0
+        for game in overdue:
+            action = game.pending_action
+            # The action may have been submitted since, with its own verdict
+            swept += Game.objects.filter(
+                pk=game.pk, forfeit=None, pending_action=action
+            ).update(
+                forfeit=action.player_id,
+                forfeit_time=now - action.create_timestamp,
+            )
+
+        self.stdout.write(f"Recorded {swept} forfeits")
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("softserve", "0004_alter_event_name"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="action",
+            name="legal_actions",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
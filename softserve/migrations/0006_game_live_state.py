@@ -0,0 +1,79 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_live_state(apps, schema_editor):
+    Game = apps.get_model("softserve", "Game")
+
+    for game in Game.objects.iterator():
+        game.state = game.initial_state
+        game.status = "finished" if game.end_timestamp else "ongoing"
+
+        last_action = game.action_set.select_related("player").order_by("number").last()
+        if last_action:
+            game.action_count = last_action.number
+            if last_action.submit_timestamp:
+                game.state = last_action.after_state
+                game.turn_number = 1 - last_action.player.number
+            else:
+                game.state = last_action.before_state
+                game.turn_number = last_action.player.number
+                game.pending_action = last_action
+
+        game.save(
+            update_fields=[
+                "state",
+                "status",
+                "turn_number",
+                "action_count",
+                "pending_action",
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("softserve", "0005_action_legal_actions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="game",
+            name="action_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="game",
+            name="pending_action",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="softserve.action",
+            ),
+        ),
+        migrations.AddField(
+            model_name="game",
+            name="state",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="game",
+            name="status",
+            field=models.CharField(
+                choices=[("ongoing", "Ongoing"), ("finished", "Finished")],
+                default="ongoing",
+                max_length=16,
+            ),
+        ),
+        migrations.AddField(
+            model_name="game",
+            name="turn_number",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_live_state, migrations.RunPython.noop),
+    ]
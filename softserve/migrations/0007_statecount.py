@@ -0,0 +1,80 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:36
+
+from collections import Counter
+from hashlib import blake2b
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def state_hash(state):
+    digest = blake2b(state.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def count_states(apps, schema_editor):
+    Game = apps.get_model("softserve", "Game")
+    StateCount = apps.get_model("softserve", "StateCount")
+
+    for game in Game.objects.iterator():
+        history = [game.initial_state]
+        history += (
+            game.action_set.exclude(after_state="")
+            .order_by("number")
+            .values_list("after_state", flat=True)
+        )
+        counts = Counter(history)
+
+        StateCount.objects.bulk_create(
+            StateCount(game=game, state_hash=state_hash(state), count=count)
+            for state, count in counts.items()
+            # Like StateCount.add(), leave out an initial state seen only once
+            if count > 1 or state != game.initial_state
+        )
+        game.repetitions = max(counts.values())
+        game.save(update_fields=["repetitions"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("softserve", "0006_game_live_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="game",
+            name="repetitions",
+            field=models.IntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name="StateCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("state_hash", models.BigIntegerField()),
+                ("count", models.IntegerField(default=1)),
+                (
+                    "game",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="softserve.game"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("game", "state_hash"), name="unique_game_state_hash"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(count_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_forfeits(apps, schema_editor):
+    Game = apps.get_model("softserve", "Game")
+
+    for game in Game.objects.iterator():
+        actions = game.action_set.exclude(submit_timestamp=None).order_by("number")
+        for action in actions:
+            think_time = action.submit_timestamp - action.create_timestamp
+            if think_time > settings.SOFTSERVE_THINK_TIME:
+                game.forfeit_id = action.player_id
+                game.forfeit_time = think_time
+                game.save(update_fields=["forfeit", "forfeit_time"])
+                break
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("softserve", "0007_statecount"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="game",
+            name="forfeit",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="softserve.player",
+            ),
+        ),
+        migrations.AddField(
+            model_name="game",
+            name="forfeit_time",
+            field=models.DurationField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="game",
+            index=models.Index(
+                fields=["event", "forfeit"], name="softserve_g_event_i_dd905f_idx"
+            ),
+        ),
+        migrations.RunPython(record_forfeits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,180 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:45
+
+from hashlib import blake2b
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def state_hash(state):
+    digest = blake2b(state.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def intern_states(apps, schema_editor):
+    Action = apps.get_model("softserve", "Action")
+    Game = apps.get_model("softserve", "Game")
+    State = apps.get_model("softserve", "State")
+
+    def intern(texts):
+        State.objects.bulk_create(
+            [State(id=state_hash(text), text=text) for text in set(texts) if text],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+
+    games = Game.objects.only("initial_state", "state")
+    for game in games.iterator():
+        intern([game.initial_state, game.state or game.initial_state])
+        game.initial_id = state_hash(game.initial_state)
+        game.current_id = state_hash(game.state or game.initial_state)
+        game.save(update_fields=["initial", "current"])
+
+        actions = list(game.action_set.only("before_state", "after_state"))
+        intern([action.before_state for action in actions])
+        intern([action.after_state for action in actions])
+        for action in actions:
+            action.before_id = state_hash(action.before_state)
+            if action.after_state:
+                action.after_id = state_hash(action.after_state)
+        Action.objects.bulk_update(actions, ["before", "after"], batch_size=1000)
+
+
+def restore_state_text(apps, schema_editor):
+    Action = apps.get_model("softserve", "Action")
+    Game = apps.get_model("softserve", "Game")
+
+    games = Game.objects.select_related("initial", "current")
+    for game in games.iterator():
+        game.initial_state = game.initial.text
+        game.state = game.current.text
+        game.save(update_fields=["initial_state", "state"])
+
+    actions = Action.objects.select_related("before", "after")
+    for action in actions.iterator():
+        action.before_state = action.before.text
+        action.after_state = action.after.text if action.after else ""
+        action.save(update_fields=["before_state", "after_state"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("softserve", "0008_game_forfeit"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="State",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("text", models.TextField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="action",
+            name="before",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="softserve.state",
+            ),
+        ),
+        migrations.AddField(
+            model_name="action",
+            name="after",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="softserve.state",
+            ),
+        ),
+        migrations.AddField(
+            model_name="game",
+            name="initial",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="softserve.state",
+            ),
+        ),
+        migrations.AddField(
+            model_name="game",
+            name="current",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="softserve.state",
+            ),
+        ),
+        # Nullable text, so unapplying this can add the columns back first
+        migrations.AlterField(
+            model_name="action",
+            name="before_state",
+            field=models.TextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name="action",
+            name="after_state",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="game",
+            name="initial_state",
+            field=models.TextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name="game",
+            name="state",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.RunPython(intern_states, restore_state_text),
+        migrations.RemoveField(
+            model_name="action",
+            name="before_state",
+        ),
+        migrations.RemoveField(
+            model_name="action",
+            name="after_state",
+        ),
+        migrations.RemoveField(
+            model_name="game",
+            name="initial_state",
+        ),
+        migrations.RemoveField(
+            model_name="game",
+            name="state",
+        ),
+        migrations.AlterField(
+            model_name="action",
+            name="before",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="softserve.state",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="game",
+            name="initial",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="softserve.state",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="game",
+            name="current",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="softserve.state",
+            ),
+        ),
+    ]
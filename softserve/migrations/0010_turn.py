@@ -0,0 +1,83 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def index_turns(apps, schema_editor):
+    Player = apps.get_model("softserve", "Player")
+    Turn = apps.get_model("softserve", "Turn")
+
+    players = Player.objects.filter(
+        game__status="ongoing", number=models.F("game__turn_number")
+    ).select_related("game")
+    Turn.objects.bulk_create(
+        (
+            Turn(
+                game=player.game,
+                event_id=player.game.event_id,
+                user_id=player.user_id,
+                player=player,
+            )
+            for player in players.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("softserve", "0009_state"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Turn",
+            fields=[
+                (
+                    "game",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="+",
+                        serialize=False,
+                        to="softserve.game",
+                    ),
+                ),
+                ("since", models.DateTimeField(auto_now_add=True)),
+                (
+                    "event",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="softserve.event",
+                    ),
+                ),
+                (
+                    "player",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="softserve.player",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["event", "user", "since"],
+                        name="softserve_t_event_i_917a2c_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(index_turns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("softserve", "0010_turn"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="turn",
+            index=models.Index(
+                fields=["user", "since"], name="softserve_t_user_id_5a3587_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+def remove_duplicate_actions(apps, schema_editor):
+    Action = apps.get_model("softserve", "Action")
+    Game = apps.get_model("softserve", "Game")
+
+    duplicated = (
+        Action.objects.values("game", "number")
+        .annotate(copies=models.Count("id"))
+        .filter(copies__gt=1)
+    )
+    for duplicate in duplicated:
+        # Keep a submitted action if there is one, else the first created
+        actions = Action.objects.filter(
+            game=duplicate["game"], number=duplicate["number"]
+        ).order_by(models.F("submit_timestamp").asc(nulls_last=True), "id")
+        keep, *extra = actions
+        for action in extra:
+            Game.objects.filter(pending_action=action).update(
+                pending_action=None if keep.submit_timestamp else keep
+            )
+            action.delete()
+
+
+class Migration(migrations.Migration):
+    # Postgres won't alter a table with pending deferred constraint checks,
+    # so the clean-up commits before the constraint is added
+    atomic = False
+
+    dependencies = [
+        ("softserve", "0011_turn_user_since"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_actions, migrations.RunPython.noop, atomic=True
+        ),
+        migrations.AddField(
+            model_name="turn",
+            name="claimed",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="action",
+            constraint=models.UniqueConstraint(
+                fields=("game", "number"), name="unique_game_action_number"
+            ),
+        ),
+    ]
@@ -0,0 +1,165 @@
+# Generated by Django 6.0.2 on 2026-10-18 09:02
+
+from collections import Counter
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+COUNTS = ["ongoing", "wins", "losses", "draws", "forfeit_wins", "forfeit_losses"]
+
+
+def tally_game(players, winner, forfeit_id):
+    x, y = [
+        next(player.user_id for player in players if player.number == number)
+        for number in [0, 1]
+    ]
+    results = {}
+    changes = {}
+    for forfeits in [False, True]:
+        for player in players:
+            counts = changes.setdefault((player.user_id, forfeits), Counter())
+            counts["ongoing"] -= 1
+
+            if forfeits and forfeit_id:
+                if player.id == forfeit_id:
+                    counts["forfeit_losses"] += 1
+                    if player.user_id == x:
+                        results[forfeits] = "x forfeit"
+                    if player.user_id == y:
+                        results[forfeits] = "y forfeit"
+                else:
+                    counts["forfeit_wins"] += 1
+                continue
+
+            if player.number == winner:
+                counts["wins"] += 1
+                if player.user_id == x:
+                    results[forfeits] = "x win"
+                if player.user_id == y:
+                    results[forfeits] = "y win"
+            elif winner is not None:
+                counts["losses"] += 1
+            else:
+                counts["draws"] += 1
+                results[forfeits] = "draw"
+
+    return results[False], results[True], changes
+
+
+def build_standings(apps, schema_editor):
+    Game = apps.get_model("softserve", "Game")
+    GameResult = apps.get_model("softserve", "GameResult")
+    Standing = apps.get_model("softserve", "Standing")
+
+    totals = {}
+    results = []
+    for game in Game.objects.prefetch_related("player_set").iterator(1000):
+        players = list(game.player_set.all())
+        result = GameResult(game=game, event_id=game.event_id)
+        for player in players:
+            for forfeits in [False, True]:
+                key = (game.event_id, player.user_id, forfeits)
+                totals.setdefault(key, Counter())["ongoing"] += 1
+
+        if game.status == "finished":
+            winner = next((p.number for p in players if p.winner), None)
+            result.result, result.forfeit_result, changes = tally_game(
+                players, winner, game.forfeit_id
+            )
+            for (user_id, forfeits), change in changes.items():
+                totals[(game.event_id, user_id, forfeits)].update(change)
+        results.append(result)
+
+    GameResult.objects.bulk_create(results, batch_size=1000)
+    Standing.objects.bulk_create(
+        (
+            Standing(
+                event_id=event_id,
+                user_id=user_id,
+                forfeits=forfeits,
+                **{count: counts[count] for count in COUNTS},
+            )
+            for (event_id, user_id, forfeits), counts in totals.items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("softserve", "0012_turn_claimed_unique_action_number"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GameResult",
+            fields=[
+                (
+                    "game",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="result",
+                        serialize=False,
+                        to="softserve.game",
+                    ),
+                ),
+                ("result", models.CharField(default="ongoing", max_length=16)),
+                ("forfeit_result", models.CharField(default="ongoing", max_length=16)),
+                (
+                    "event",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="softserve.event",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Standing",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("forfeits", models.BooleanField()),
+                ("ongoing", models.IntegerField(default=0)),
+                ("wins", models.IntegerField(default=0)),
+                ("losses", models.IntegerField(default=0)),
+                ("draws", models.IntegerField(default=0)),
+                ("forfeit_wins", models.IntegerField(default=0)),
+                ("forfeit_losses", models.IntegerField(default=0)),
+                (
+                    "event",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="softserve.event",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("event", "user", "forfeits"),
+                        name="unique_event_user_forfeits",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_standings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("softserve", "0013_standings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="turn",
+            name="claimed_by",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -2,13 +2,17 @@ from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.core.mail import send_mail
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Case, F, Q, Subquery, Value, When
 
 from .exceptions import SoftserveException
+from .updates import publish
 
 from collections import Counter
+from datetime import datetime
+from hashlib import blake2b
 from itertools import combinations
-from random import shuffle
+from time import time_ns
 import secrets
 import urllib
 
@@ -17,6 +21,57 @@ AUTO_CREATE_EVENTS = [
 ]
 
 
+def state_hash(state):
+    """Stable 64-bit hash of a state, used as its State id"""
+    digest = blake2b(state.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class State(models.Model):
+    """A game state, stored once however many games and actions reach it"""
+
+    id = models.BigIntegerField(primary_key=True)
+    text = models.TextField()
+
+    @classmethod
+    def of(cls, text):
+        return cls(id=state_hash(text), text=text)
+
+    @classmethod
+    def intern(cls, instance, *fields):
+        """Store any new states assigned to the given fields of an instance"""
+        states = [
+            getattr(instance, name)
+            for name in fields
+            if instance._meta.get_field(name).is_cached(instance)
+        ]
+        new = [state for state in states if state and state._state.adding]
+        if new:
+            cls.objects.bulk_create(new, ignore_conflicts=True)
+
+    def __str__(self):
+        return self.text
+
+
+def state_text(field):
+    """Property for the text of the State a foreign key refers to"""
+
+    def get(self):
+        state = getattr(self, field)
+        return state.text if state else ""
+
+    def set(self, text):
+        setattr(self, field, State.of(text) if text else None)
+
+    return property(get, set)
+
+
+class ActionManager(models.Manager):
+    def for_submit(self):
+        """Actions with everything needed to check and submit them"""
+        return self.select_related("player__user", "game", "before")
+
+
 class Action(models.Model):
     """A single, discrete action taken by a player during a game"""
 
@@ -27,39 +82,90 @@ class Action(models.Model):
     number = models.IntegerField()
 
     # State before the action
-    before_state = models.TextField()
+    before = models.ForeignKey("State", on_delete=models.PROTECT, related_name="+")
     # Notation for the action itself
     notation = models.TextField(blank=True)
     # State after the action
-    after_state = models.TextField(blank=True)
+    after = models.ForeignKey(
+        "State", on_delete=models.PROTECT, blank=True, null=True, related_name="+"
+    )
+
+    before_state = state_text("before")
+    after_state = state_text("after")
+
+    # Actions available from before_state, stored when the action is created
+    legal_actions = models.JSONField(blank=True, null=True)
 
     # Create and submit times are tracked separately, to determine think time
     create_timestamp = models.DateTimeField(auto_now_add=True)
     submit_timestamp = models.DateTimeField(blank=True, null=True)
 
+    objects = ActionManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["game", "number"], name="unique_game_action_number"
+            ),
+        ]
+
     @property
     def think_time(self):
         if not self.submit_timestamp:
             return None
         return self.submit_timestamp - self.create_timestamp
 
+    def save(self, **kwargs):
+        # Submitting the game's pending action moves the game along with it
+        submitting = (
+            self.pk is not None
+            and self.submit_timestamp is not None
+            and self.game.pending_action_id == self.pk
+        )
+        with transaction.atomic(savepoint=False):
+            State.intern(self, "before", "after")
+            super().save(**kwargs)
+            if submitting:
+                self.game.advance(self)
+
+    def submit(self, notation, after_state, now, finished=False, winner=None):
+        """Submit the action, moving its game on (see Game.advance)
+
+        With the action loaded by Action.objects.for_submit(), this takes
+        five queries (plus BEGIN and COMMIT), or eight once the game ends and
+        its standings are updated (nine if it is won), and one more after
+        committing to publish them.
+        """
+        self.notation = notation
+        self.after_state = after_state
+        self.submit_timestamp = now
+        with transaction.atomic():
+            State.intern(self, "after")
+            self.game.advance(self, finished, winner)
+            self.save(update_fields=["notation", "after", "submit_timestamp"])
+
     def __str__(self):
-        return f"{self.game} action {self.number} ({self.user.username})"
+        return f"{self.game} action {self.number} ({self.player})"
 
 
 class EventManager(models.Manager):
     def find_any_game_for(self, user):
-        events = list(self.all())
-        shuffle(events)
-        for event in events:
-            if event.name in AUTO_CREATE_EVENTS:
-                continue
-
-            game = event.find_game_for(user)
-            if game:
-                return game
+        # The game that has waited longest for this user, in any event
+        turn = (
+            Turn.objects.filter(user=user)
+            .exclude(event__name__in=AUTO_CREATE_EVENTS)
+            .select_related("game")
+            .order_by("since", "game")
+            .first()
+        )
+        return turn.game if turn else None
 
-        return None
+    def claim_any_game_for(self, user, client=""):
+        """Like find_any_game_for, but hand each game to one caller at a time"""
+        return Turn.claim(
+            Turn.objects.filter(user=user).exclude(event__name__in=AUTO_CREATE_EVENTS),
+            client,
+        )
 
 
 class Event(models.Model):
@@ -78,6 +184,24 @@ class Event(models.Model):
             self.name = f"tournament-{self.id}"
             super().save()
 
+    @staticmethod
+    def data_version(event_id):
+        """Version of the event's dashboard data, which changes along with it"""
+        key = f"event:{event_id}:version"
+        version = cache.get(key)
+        if version is None:
+            # Start from the time, so an evicted version is never reused
+            cache.add(key, time_ns(), None)
+            version = cache.get(key)
+        return version
+
+    @staticmethod
+    def bump_data_version(event_id):
+        try:
+            cache.incr(f"event:{event_id}:version")
+        except ValueError:
+            cache.add(f"event:{event_id}:version", time_ns(), None)
+
     def add_game(self, p1, p2):
         game = Game.objects.create(event=self)
         game.add_player(p1)
@@ -91,15 +215,41 @@ class Event(models.Model):
         ):
             raise SoftserveException("Too many games for event")
 
+        matchups = []
         for p1, p2 in combinations(users, 2):
             for _ in range(game_pairs):
-                self.add_game(p1, p2)
-                self.add_game(p2, p1)
+                matchups += [(p1, p2), (p2, p1)]
+
+        # Bulk equivalent of calling add_game() for each matchup
+        initial = State.of(settings.SOFTSERVE_INITIAL_STATE)
+        with transaction.atomic():
+            State.objects.bulk_create([initial], ignore_conflicts=True)
+            games = Game.objects.bulk_create(
+                Game(event=self, initial=initial, current=initial) for _ in matchups
+            )
+            players = Player.objects.bulk_create(
+                Player(game=game, user=user, number=number)
+                for game, matchup in zip(games, matchups)
+                for number, user in enumerate(matchup)
+            )
+            Turn.objects.bulk_create(
+                Turn(game=player.game, event=self, user=player.user, player=player)
+                for player in players
+                if player.number == 0
+            )
+            GameResult.objects.bulk_create(
+                GameResult(game=game, event=self) for game in games
+            )
+            Standing.add(
+                self.id,
+                Standing.starting(player.user_id for player in players),
+                create=True,
+            )
 
     def find_game_for(self, user):
         if self.name == "mirror":
             player = Player.objects.filter(
-                user=user, game__event=self, game__end_timestamp=None
+                user=user, game__event=self, game__status=Game.Status.ONGOING
             ).first()
             if player:
                 game = player.game
@@ -110,19 +260,32 @@ class Event(models.Model):
 
             return game
 
-        for player in Player.objects.filter(
-            user=user, game__event=self, game__end_timestamp=None
-        ):
-            if player.game.turn == player:
-                return player.game
+        # The game that has waited longest for this user
+        turn = (
+            Turn.objects.filter(event=self, user=user)
+            .select_related("game")
+            .order_by("since", "game")
+            .first()
+        )
+        return turn.game if turn else None
 
-        return None
+    def claim_game_for(self, user, client=""):
+        """Like find_game_for, but hand each game to one caller at a time
+
+        This lets a user run several clients at once, each getting a
+        different game. See Turn.claim for `client`.
+        """
+        if self.name == "mirror":
+            return self.find_game_for(user)
+
+        return Turn.claim(Turn.objects.filter(event=self, user=user), client)
 
     def send_created_email(self):
-        addresses = set()
-        for game in self.game_set.all():
-            for player in game.player_set.all():
-                addresses.add(player.user.email)
+        addresses = set(
+            User.objects.filter(player__game__event=self).values_list(
+                "email", flat=True
+            )
+        )
 
         send_mail(
             f"{self.name} created",
@@ -146,28 +309,76 @@ class Game(models.Model):
 
     # NOTE: This is loaded from the external engine binary
     # Decision pending on whether this is a good idea
-    initial_state = models.TextField(default=settings.SOFTSERVE_INITIAL_STATE)
+    initial = models.ForeignKey("State", on_delete=models.PROTECT, related_name="+")
 
     start_timestamp = models.DateTimeField(auto_now_add=True)
     end_timestamp = models.DateTimeField(blank=True, null=True)
 
+    class Status(models.TextChoices):
+        ONGOING = "ongoing"
+        FINISHED = "finished"
+
+    # Live state of the game, kept up to date as actions are created and
+    # submitted so it can be read without going through the actions
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.ONGOING
+    )
+    current = models.ForeignKey("State", on_delete=models.PROTECT, related_name="+")
+    # Number of the player whose turn it is
+    turn_number = models.IntegerField(default=0)
+    # Number of actions created, including a pending one
+    action_count = models.IntegerField(default=0)
+    # Most times any one state has occurred (see StateCount)
+    repetitions = models.IntegerField(default=1)
+    # First player to exceed the think time, and the time they took
+    forfeit = models.ForeignKey(
+        "Player",
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="+",
+    )
+    forfeit_time = models.DurationField(blank=True, null=True)
+    # Action created but not yet submitted, if any
+    pending_action = models.ForeignKey(
+        "Action",
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="+",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["event", "forfeit"]),
+        ]
+
+    initial_state = state_text("initial")
+    state = state_text("current")
+
+    def save(self, **kwargs):
+        if self.initial_id is None:
+            self.initial_state = settings.SOFTSERVE_INITIAL_STATE
+        if self.current_id is None:
+            self.current = self.initial
+        adding = self._state.adding
+        with transaction.atomic():
+            State.intern(self, "initial", "current")
+            super().save(**kwargs)
+            if adding:
+                GameResult.objects.create(game=self, event_id=self.event_id)
+
     @property
     def last_action(self):
         """Get the sequencially highest action (but don't create a new one)"""
-        return self.action_set.order_by("number").last()
+        if self.pending_action_id:
+            return self.pending_action
+        return self.action_set.filter(number=self.action_count).first()
 
     @property
     def turn(self):
         """Get the player whose turn it is to act"""
-        # NOTE: This assumes one action per turn and no skipping players
-        last_action = self.last_action
-
-        if not last_action:
-            return self.player_set.get(number=0)
-
-        if last_action.submit_timestamp:
-            return self.last_action.player.opponent
-        return self.last_action.player
+        return self.player_set.get(number=self.turn_number)
 
     @property
     def duration(self):
@@ -175,15 +386,28 @@ class Game(models.Model):
 
     @property
     def depth(self):
-        return self.action_set.order_by("-number").first().number + 1
+        return self.action_count + 1
 
     @property
     def history(self):
-        history = [self.initial_state]
-        actions = self.action_set.order_by("number")
-        history += [action.after_state for action in actions if action.after_state]
+        return self.history_since(0)
+
+    def history_since(self, start):
+        """Get the states in the history from index start on"""
+        history = [self.initial_state] if start == 0 else []
+        history += (
+            self.action_set.filter(number__gte=start)
+            .exclude(after=None)
+            .order_by("number")
+            .values_list("after__text", flat=True)
+        )
         return history
 
+    @property
+    def history_length(self):
+        """Number of states in the history"""
+        return self.action_count + (0 if self.pending_action_id else 1)
+
     @property
     def history_actions(self):
         history = [self.initial_state]
@@ -192,45 +416,152 @@ class Game(models.Model):
 
     @property
     def threefold_repetition(self):
-        counts = Counter()
-        for state in self.history:
-            counts[state] += 1
-        return max(counts.values()) >= 3
-
-    @property
-    def forfeit(self):
-        """Returns the first player to exceed think time, if any"""
-        for action in self.action_set.order_by("number"):
-            if action.think_time > settings.SOFTSERVE_THINK_TIME:
-                return action.player
-        return None
+        return self.repetitions >= 3
 
     def add_player(self, user):
         if self.player_set.count() >= 2:
             raise SoftserveException(f"{ str(self) } is full")
-        Player.objects.create(game=self, user=user, number=self.player_set.count())
+        player = Player.objects.create(
+            game=self, user=user, number=self.player_set.count()
+        )
+        if player.number == self.turn_number:
+            Turn.objects.create(
+                game=self, event_id=self.event_id, user=user, player=player
+            )
+        Standing.add(self.event_id, Standing.starting([user.id]), create=True)
+        transaction.on_commit(
+            lambda: Event.bump_data_version(self.event_id), robust=True
+        )
 
     def next_action(self):
         """Create (if necessary) and return the next action"""
-        last_action = self.last_action
+        if self.pending_action_id:
+            return self.pending_action
+
+        with transaction.atomic():
+            # Lock the game so concurrent callers can't both create an action
+            game = (
+                Game.objects.select_for_update(of=("self",))
+                .select_related("current")
+                .get(pk=self.pk)
+            )
+            if game.pending_action_id:
+                action = game.pending_action
+            else:
+                action = Action.objects.create(
+                    game=self,
+                    player=game.turn,
+                    number=game.action_count + 1,
+                    before=game.current,
+                )
+                Game.objects.filter(pk=self.pk).update(
+                    pending_action=action, action_count=action.number
+                )
+
+        self.pending_action = action
+        self.action_count = action.number
+        return action
+
+    def advance(self, action, finished=False, winner=None):
+        """Move the game on past its pending action, once it's been submitted
+
+        The game finishes if `finished` is set, won by the player numbered
+        `winner` (or drawn if None), or if the action's state has now
+        occurred three times. Raises SoftserveException if the action is no
+        longer pending.
+        """
+        with transaction.atomic(savepoint=False):
+            count = StateCount.add(self, action.after_id)
+            fields = dict(
+                current=action.after,
+                turn_number=1 - action.player.number,
+                pending_action=None,
+                repetitions=max(self.repetitions, count),
+            )
+            think_time = action.think_time
+            if not self.forfeit_id and think_time > settings.SOFTSERVE_THINK_TIME:
+                fields.update(forfeit=action.player, forfeit_time=think_time)
+            if finished or fields["repetitions"] >= 3:
+                fields.update(
+                    status=Game.Status.FINISHED, end_timestamp=action.submit_timestamp
+                )
+
+            # Only the first submit of the pending action gets through
+            game = Game.objects.filter(pk=self.pk, pending_action=action)
+            if not game.update(**fields):
+                raise SoftserveException("action has already been submitted")
+            for field, value in fields.items():
+                setattr(self, field, value)
+
+            if self.status == Game.Status.FINISHED:
+                self.settle(winner)
+            else:
+                player = Player.objects.filter(game=self, number=self.turn_number)
+                Turn.objects.filter(game=self).update(
+                    player=Subquery(player.values("pk")),
+                    user=Subquery(player.values("user")),
+                    since=datetime.now(),
+                    claimed=None,
+                    claimed_by="",
+                )
+
+    def finish(self, winner, now):
+        """End the game, won by the player with the given number (None for a draw)"""
+        with transaction.atomic():
+            self.end_timestamp = now
+            self.status = Game.Status.FINISHED
+            self.save(update_fields=["end_timestamp", "status"])
+            self.settle(winner)
+
+    def settle(self, winner):
+        """Record the result of a game that has just finished"""
+        Turn.objects.filter(game=self).delete()
+        if winner is not None:
+            self.player_set.filter(number=winner).update(winner=True)
+
+        players = list(self.player_set.only("game", "number", "user"))
+        result, forfeit_result, changes = tally_game(players, winner, self.forfeit_id)
+        GameResult.objects.filter(game=self).update(
+            result=result, forfeit_result=forfeit_result
+        )
+        Standing.add(self.event_id, changes)
 
-        if last_action:
-            # If we've created an action but it hasn't been submitted yet
-            if last_action.submit_timestamp == None:
-                return last_action
+        # Only once committed, so the data can't be cached under the new
+        # version before it changes. Data across all events is versioned as
+        # the "*" event.
+        transaction.on_commit(
+            lambda: Event.bump_data_version(self.event_id), robust=True
+        )
+        transaction.on_commit(lambda: Event.bump_data_version("*"), robust=True)
+        transaction.on_commit(
+            lambda: self.publish_result(players, result, forfeit_result), robust=True
+        )
 
-            state = last_action.after_state
-            number = last_action.number + 1
-        else:
-            state = self.initial_state
-            number = 1
-            number = 1
-
-        return Action.objects.create(
-            game=self,
-            player=self.turn,
-            number=number,
-            before_state=state,
+    def publish_result(self, players, result, forfeit_result):
+        """Send the game's result and its players' standings to live dashboards"""
+        standings = Standing.objects.filter(
+            event_id=self.event_id, user__in={player.user_id for player in players}
+        ).select_related("user")
+        usernames = {standing.user_id: standing.user.username for standing in standings}
+        x, y = [
+            next(usernames[p.user_id] for p in players if p.number == number)
+            for number in [0, 1]
+        ]
+        publish(
+            self.event_id,
+            {
+                "game": {
+                    "id": self.id,
+                    "x": x,
+                    "y": y,
+                    "result": result,
+                    "forfeit_result": forfeit_result,
+                },
+                "standings": [
+                    [standing.user.username, standing.forfeits, standing.counts()]
+                    for standing in standings
+                ],
+            },
         )
 
     def player_name(self, number):
@@ -251,6 +582,43 @@ class Game(models.Model):
             return f"#{self.id} {self.event}: awaiting matchup"
 
 
+class StateCount(models.Model):
+    """How many times a state has occurred in a game"""
+
+    game = models.ForeignKey("Game", on_delete=models.CASCADE)
+    # Id of the State
+    state_hash = models.BigIntegerField()
+    count = models.IntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["game", "state_hash"], name="unique_game_state_hash"
+            ),
+        ]
+
+    @classmethod
+    def add(cls, game, state_id):
+        """Count another occurrence of a state, returning its new count
+
+        This should be in the same transaction as the submit it's for, so
+        it's undone if the submit fails.
+        """
+        # The initial state isn't counted until it comes round again
+        first = 2 if state_id == game.initial_id else 1
+
+        # An upsert that returns the count, which the ORM can't express
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (game_id, state_hash, count) VALUES (%s, %s, %s) "
+                f"ON CONFLICT (game_id, state_hash) DO UPDATE SET count = {table}.count + 1 "
+                "RETURNING count",
+                [game.pk, state_id, first],
+            )
+            return cursor.fetchone()[0]
+
+
 # NOTE: When the user-facing API uses the term player, it refers to a
 # Django user, not this class. This class here is the junction between
 # users and games.
@@ -282,3 +650,221 @@ class Player(models.Model):
 
     def __str__(self):
         return self.user.username
+
+
+class Turn(models.Model):
+    """Whose turn it is in an ongoing game
+
+    This indexes games by the user they're waiting on, so a user's next
+    game can be found without looking through all of their games.
+    """
+
+    game = models.OneToOneField(
+        "Game", on_delete=models.CASCADE, primary_key=True, related_name="+"
+    )
+    event = models.ForeignKey("Event", on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    player = models.ForeignKey("Player", on_delete=models.CASCADE)
+    # When the turn began
+    since = models.DateTimeField(auto_now_add=True)
+    # When a client was last handed the game, if it has been, and the id
+    # that client gave
+    claimed = models.DateTimeField(blank=True, null=True)
+    claimed_by = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["event", "user", "since"]),
+            models.Index(fields=["user", "since"]),
+        ]
+
+    @classmethod
+    def claim(cls, turns, client=""):
+        """Claim the longest-waiting of some turns, returning its game
+
+        Turns claimed by someone else are skipped, unless their claim is
+        older than SOFTSERVE_CLAIM_TIMEOUT, as the client may have given up.
+        A client that gives an id gets back a game it already holds first,
+        so it can retry a request whose response it lost.
+        """
+        now = datetime.now()
+        available = Q(claimed=None) | Q(
+            claimed__lt=now - settings.SOFTSERVE_CLAIM_TIMEOUT
+        )
+        if client:
+            available |= Q(claimed_by=client)
+            order = [Case(When(claimed_by=client, then=0), default=1)]
+        else:
+            order = []
+        with transaction.atomic():
+            turn = (
+                turns.filter(available)
+                .select_for_update(skip_locked=True, of=("self",))
+                .select_related("game")
+                .order_by(*order, "since", "game")
+                .first()
+            )
+            if not turn:
+                return None
+
+            turn.claimed = now
+            turn.claimed_by = client
+            turn.save(update_fields=["claimed", "claimed_by"])
+            return turn.game
+
+
+def tally_game(players, winner, forfeit_id):
+    """Work out how a finished game counts towards an event's standings
+
+    Returns the game's result without and with forfeits counted separately,
+    and the changes to the players' standings, by (user id, forfeits).
+    """
+    x, y = [
+        next(player.user_id for player in players if player.number == number)
+        for number in [0, 1]
+    ]
+    results = {}
+    changes = {}
+    for forfeits in [False, True]:
+        for player in players:
+            counts = changes.setdefault((player.user_id, forfeits), Counter())
+            counts["ongoing"] -= 1
+
+            if forfeits and forfeit_id:
+                if player.id == forfeit_id:
+                    counts["forfeit_losses"] += 1
+                    if player.user_id == x:
+                        results[forfeits] = "x forfeit"
+                    if player.user_id == y:
+                        results[forfeits] = "y forfeit"
+                else:
+                    counts["forfeit_wins"] += 1
+                continue
+
+            if player.number == winner:
+                counts["wins"] += 1
+                if player.user_id == x:
+                    results[forfeits] = "x win"
+                if player.user_id == y:
+                    results[forfeits] = "y win"
+            elif winner is not None:
+                counts["losses"] += 1
+            else:
+                counts["draws"] += 1
+                results[forfeits] = "draw"
+
+    return results[False], results[True], changes
+
+
+def tally_games(games):
+    """Work out an event's standings and game results from scratch
+
+    `games` should have their players prefetched. Returns the unsaved
+    GameResult of each game, and the totals of the standings as Counters by
+    (user id, forfeits).
+    """
+    results = []
+    totals = {}
+    for game in games:
+        players = list(game.player_set.all())
+        counts = Standing.starting(player.user_id for player in players)
+
+        result = GameResult(game=game, event_id=game.event_id)
+        if game.status == Game.Status.FINISHED:
+            winner = next((p.number for p in players if p.winner), None)
+            result.result, result.forfeit_result, changes = tally_game(
+                players, winner, game.forfeit_id
+            )
+            for key, change in changes.items():
+                counts[key].update(change)
+        results.append(result)
+
+        for key, count in counts.items():
+            totals.setdefault(key, Counter()).update(count)
+
+    return results, totals
+
+
+class Standing(models.Model):
+    """A user's results so far in an event
+
+    Each user has two rows per event: one where games with a forfeit count
+    only as forfeits, as the event dashboard shows by default, and one
+    where they count like any other game.
+    """
+
+    event = models.ForeignKey("Event", on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    forfeits = models.BooleanField()
+
+    ongoing = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    losses = models.IntegerField(default=0)
+    draws = models.IntegerField(default=0)
+    forfeit_wins = models.IntegerField(default=0)
+    forfeit_losses = models.IntegerField(default=0)
+
+    COUNTS = ["ongoing", "wins", "losses", "draws", "forfeit_wins", "forfeit_losses"]
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["event", "user", "forfeits"], name="unique_event_user_forfeits"
+            ),
+        ]
+
+    @staticmethod
+    def starting(user_ids):
+        """Changes for starting games with the given players"""
+        changes = {}
+        for user_id in user_ids:
+            for forfeits in [False, True]:
+                changes.setdefault((user_id, forfeits), Counter())["ongoing"] += 1
+        return changes
+
+    @classmethod
+    def add(cls, event_id, changes, create=False):
+        """Apply changes to standings, as Counters by (user id, forfeits)
+
+        This is a single UPDATE, preceded by an INSERT of any missing rows if
+        `create` is set.
+        """
+        if create:
+            cls.objects.bulk_create(
+                (
+                    cls(event_id=event_id, user_id=user_id, forfeits=forfeits)
+                    for user_id, forfeits in changes
+                ),
+                ignore_conflicts=True,
+            )
+
+        updates = {}
+        for count in cls.COUNTS:
+            cases = [
+                When(user_id=user_id, forfeits=forfeits, then=Value(counts[count]))
+                for (user_id, forfeits), counts in changes.items()
+                if counts[count]
+            ]
+            if cases:
+                updates[count] = F(count) + Case(*cases, default=Value(0))
+
+        users = {user_id for user_id, _ in changes}
+        cls.objects.filter(event_id=event_id, user__in=users).update(**updates)
+
+    def counts(self):
+        """The nonzero counts, as the event dashboard expects them"""
+        return {
+            count: getattr(self, count) for count in self.COUNTS if getattr(self, count)
+        }
+
+
+class GameResult(models.Model):
+    """A game's result as the event dashboard shows it"""
+
+    game = models.OneToOneField(
+        "Game", on_delete=models.CASCADE, primary_key=True, related_name="result"
+    )
+    event = models.ForeignKey("Event", on_delete=models.CASCADE)
+    # E.g. "x win", "draw"; without and with forfeits counted separately
+    result = models.CharField(max_length=16, default="ongoing")
+    forfeit_result = models.CharField(max_length=16, default="ongoing")
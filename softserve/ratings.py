@@ -0,0 +1,135 @@
+"""Bradley-Terry ratings from game results
+
+Games are counted up per pair of players by the database, so fitting the
+ratings takes time in the number of pairs that have met, however many games
+they have played.
+"""
+
+from math import exp, log, sqrt
+
+from django.contrib.auth.models import User
+from django.db.models import Count, F, OuterRef, Q, Subquery
+
+from .models import Game, Player
+
+# Elo's scale, where a 400 point difference means 10 to 1 odds
+BASE = 1500
+SCALE = 400 / log(10)
+# Everyone is given this many draws against an average player, keeping the
+# ratings of those who have won or lost every game finite
+PRIOR_GAMES = 1
+# For approximate 95% confidence intervals
+Z = 1.96
+
+
+def pair_results(games):
+    """Count the results of finished games by pair of users
+
+    Returns (x user id, y user id, x wins, y wins, games) for each pair, in
+    a single query. Games against oneself are left out.
+    """
+    opponent = Player.objects.filter(game=OuterRef("game"), number=1)
+    return list(
+        Player.objects.filter(
+            number=0, game__in=games.filter(status=Game.Status.FINISHED)
+        )
+        .annotate(
+            opponent=Subquery(opponent.values("user")),
+            opponent_won=Subquery(opponent.values("winner")),
+        )
+        .exclude(opponent=F("user"))
+        .values_list("user", "opponent")
+        .annotate(
+            x_wins=Count("id", filter=Q(winner=True)),
+            y_wins=Count("id", filter=Q(opponent_won=True)),
+            games=Count("id"),
+        )
+        .order_by()
+    )
+
+
+def fit(pairs, start=None, tolerance=1e-6, max_iterations=1000):
+    """Fit Bradley-Terry strengths to pair results, by user id
+
+    Draws count as half a win for each side. This uses Hunter's MM
+    algorithm, which converges in fewer iterations when started from
+    strengths fitted to most of the same games.
+    """
+    scores = {}
+    meetings = {}
+    for x, y, x_wins, y_wins, games in pairs:
+        draws = games - x_wins - y_wins
+        scores[x] = scores.get(x, PRIOR_GAMES / 2) + x_wins + draws / 2
+        scores[y] = scores.get(y, PRIOR_GAMES / 2) + y_wins + draws / 2
+        meetings.setdefault(x, []).append((y, games))
+        meetings.setdefault(y, []).append((x, games))
+
+    if not meetings:
+        return {}
+
+    start = start or {}
+    strengths = {user: start.get(user, 1.0) for user in meetings}
+    for _ in range(max_iterations):
+        change = 0
+        for user, opponents in meetings.items():
+            strength = strengths[user]
+            expected = PRIOR_GAMES / (strength + 1) + sum(
+                games / (strength + strengths[opponent])
+                for opponent, games in opponents
+            )
+            strengths[user] = scores[user] / expected
+            change = max(change, abs(log(strengths[user] / strength)))
+
+        # The prior's average player stays at 1, so the strengths can't all
+        # drift together
+        mean = sum(log(strength) for strength in strengths.values()) / len(strengths)
+        for user in strengths:
+            strengths[user] /= exp(mean)
+        if change < tolerance:
+            break
+
+    return strengths
+
+
+def rate(games, start=None):
+    """Rate the players of finished games
+
+    Returns the ratings, best first, and the strengths they came from, to
+    start from next time. Confidence intervals are approximate, taking each
+    rating's standard error from its own Fisher information, as though the
+    others' were known.
+    """
+    pairs = pair_results(games)
+    strengths = fit(pairs, start)
+
+    played = dict.fromkeys(strengths, 0)
+    information = {
+        user: PRIOR_GAMES * strength / (strength + 1) ** 2
+        for user, strength in strengths.items()
+    }
+    for x, y, _, _, games in pairs:
+        p = strengths[x] / (strengths[x] + strengths[y])
+        played[x] += games
+        played[y] += games
+        information[x] += games * p * (1 - p)
+        information[y] += games * p * (1 - p)
+
+    usernames = dict(
+        User.objects.filter(id__in=strengths).values_list("id", "username")
+    )
+    ratings = []
+    for user, strength in strengths.items():
+        rating = BASE + SCALE * log(strength)
+        error = Z * SCALE / sqrt(information[user])
+        ratings.append(
+            {
+                "player": usernames[user],
+                "rating": round(rating, 1),
+                "low": round(rating - error, 1),
+                "high": round(rating + error, 1),
+                "games": played[user],
+            }
+        )
+    ratings.sort(key=lambda rating: rating["rating"], reverse=True)
+
+    return ratings, strengths
@@ -1,14 +1,49 @@
+import asyncio
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from random import choice
 from datetime import datetime
+from io import StringIO
+import json
+import resource
+from subprocess import Popen
+import sys
+from tempfile import NamedTemporaryFile
+from threading import Event as ThreadEvent, Thread
+from time import sleep
+from unittest.mock import patch
 
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.management import call_command
-from django.test import TestCase, TransactionTestCase
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
+from redis import Redis
 
+from .api import util
+from .api.admission import STATE, SUBMIT, THINK, AdmissionControl, EngineBusy
+from .api.cache import EngineCache, LRUCache
+from .api.jobs import (
+    CANCELLED,
+    DONE,
+    QUEUED,
+    RUNNING,
+    ThinkScheduler,
+    ThinkUnavailable,
+)
+from .api.pool import EnginePool, EngineWorkerError, EngineWorkerTimeout
+from .api.limits import CircuitBreaker, EngineCrash, EngineUnavailable, limit
 from .api.main import app
+from .api.routers.event import build_event_data, cached_event_data, view_update
 from .api.util import engine
+from . import updates
+from .exceptions import SoftserveException
+from .management.commands import rebuild_standings
 from .models import *
+from .ratings import rate
 
 
 # Class for common tasks--write tests in SoftserveTestCase or elsewhere
@@ -286,6 +321,65 @@ class SoftserveTestCase(APITestCase):
         state = r.json()["state"]
         self.assertEqual(r.json()["history"], history)
 
+        # Only ask for the states we don't have
+        r = self.client.post(
+            "/aivai/play-state",
+            json={
+                "event": "mirror",
+                "player": self.username,
+                "token": self.password,
+                "history_game_id": r.json()["game_id"],
+                "history_length": 5,
+            },
+        )
+        self.assertEqual(r.status_code, 200)
+        game_id = r.json()["game_id"]
+        self.assertEqual(r.json()["history"], history[5:])
+        self.assertEqual(r.json()["history_start"], 5)
+
+        r = self.client.post(
+            "/aivai/play-state",
+            json={
+                "event": "mirror",
+                "player": self.username,
+                "token": self.password,
+                "history_game_id": game_id,
+                "history_length": -3,
+            },
+        )
+        self.assertEqual(r.status_code, 422)
+
+    def test_state_batch(self):
+        state = self.get_initial_state()
+        action = self.get_actions(state)[0]
+        r = self.client.post(
+            "/state/batch",
+            json={
+                "queries": [
+                    {"op": "actions", "state": state},
+                    {"op": "winner", "state": state},
+                    {"op": "act", "state": state, "action": action},
+                    {"op": "act", "state": state, "action": "invalid"},
+                ]
+            },
+        )
+        self.assertEqual(r.status_code, 200)
+        results = r.json()["results"]
+        self.assertEqual(results[0]["actions"], self.get_actions(state))
+        self.assertEqual(
+            results[1]["winner"],
+            self.client.get(f"/state/{state}/winner").json()["winner"],
+        )
+        act = self.client.get(f"/state/{state}/act/{action}").json()
+        self.assertEqual(results[2]["state"], act["state"])
+        self.assertEqual(results[2]["actions"], act["actions"])
+        self.assertEqual(results[3]["error"], "invalid action")
+
+        r = self.client.post(
+            "/state/batch", json={"queries": [{"op": "actions", "state": "invalid"}]}
+        )
+        self.assertEqual(r.status_code, 422)
+
     def test_event_create_no_name(self):
         r = self.client.post(
             "/event/create",
@@ -384,6 +478,300 @@ class ModelTestCase(TransactionTestCase):
         # And u1 should have a name now
         self.assertNotEqual(None, self.e1.find_game_for(self.u1))
 
+    def test_submit_queries(self):
+        pk = self.g1.next_action().pk
+        # Load, check the password and submit, with the game going on (the
+        # count includes BEGIN and COMMIT)
+        with self.assertNumQueries(8):
+            action = Action.objects.for_submit().get(pk=pk)
+            self.assertTrue(action.player.user.check_password(self.password))
+            action.submit("1,-2|1,-1|0,-1|0,0", "1,-2|1,-1|0,-1|0,0|t", datetime.now())
+
+        pk = Game.objects.get(pk=self.g1.pk).next_action().pk
+        # Or with the game won, which also updates the standings, and reads
+        # them back after committing for live dashboards
+        with self.assertNumQueries(13):
+            action = Action.objects.for_submit().get(pk=pk)
+            action.submit(
+                "1,-2|1,-1|0,-1|0,0",
+                "1,-2|1,-1|0,-1|0,0|h",
+                datetime.now(),
+                finished=True,
+                winner=1,
+            )
+
+        game = Game.objects.get(pk=self.g1.pk)
+        self.assertEqual(game.status, Game.Status.FINISHED)
+        self.assertEqual(game.player_set.get(winner=True).user, self.u2)
+        self.assertFalse(Turn.objects.filter(game=game).exists())
+
+        # A second submit is refused
+        action = Action.objects.for_submit().get(pk=pk)
+        with self.assertRaises(SoftserveException):
+            action.submit("x", "y", datetime.now())
+
+    def test_event_data_queries(self):
+        self.g1.finish(0, datetime.now())
+        game = Game.objects.create(event=self.e1)
+        game.add_player(self.u2)
+        game.add_player(self.u3)
+
+        with self.assertNumQueries(2):
+            data = build_event_data(self.e1, True)
+
+        self.assertEqual(
+            [game["result"] for game in data["games"]], ["x win", "ongoing", "ongoing"]
+        )
+        self.assertEqual(data["players"]["player 1"], {"wins": 1, "ongoing": 1})
+        self.assertEqual(data["players"]["player 2"], {"losses": 1, "ongoing": 1})
+
+    def test_cached_event_data(self):
+        # Ignore anything cached by an earlier run
+        Event.bump_data_version(self.e1.id)
+        with self.assertNumQueries(2):
+            cached_event_data(self.e1, True)
+        with self.assertNumQueries(0):
+            data = cached_event_data(self.e1, True)
+        self.assertEqual(data["players"]["player 1"], {"ongoing": 2})
+
+        # Finishing a game gives the data a new version
+        self.g1.finish(0, datetime.now())
+        data = cached_event_data(self.e1, True, stale=True)
+        self.assertEqual(data["players"]["player 1"], {"wins": 1, "ongoing": 1})
+
+        # While another request rebuilds it, the last data built is served
+        self.g2.finish(0, datetime.now())
+        version = Event.data_version(self.e1.id)
+        building = f"event:{self.e1.id}:data:{version}:True:building"
+        cache.add(building, True)
+        with self.assertNumQueries(0):
+            data = cached_event_data(self.e1, True, stale=True)
+        cache.delete(building)
+        self.assertEqual(data["players"]["player 1"], {"wins": 1, "ongoing": 1})
+
+    def test_publish_result(self):
+        pubsub = Redis.from_url(settings.SOFTSERVE_REDIS_URL).pubsub()
+        pubsub.subscribe(updates.channel(self.e1.id))
+        pubsub.get_message(timeout=1)
+
+        self.g1.finish(1, datetime.now())
+        update = json.loads(pubsub.get_message(timeout=1)["data"])
+        pubsub.close()
+
+        self.assertEqual(
+            view_update(update, True),
+            {
+                "game": {
+                    "id": self.g1.id,
+                    "x": "player 1",
+                    "y": "player 2",
+                    "result": "y win",
+                },
+                "players": {
+                    "player 1": {"losses": 1, "ongoing": 1},
+                    "player 2": {"wins": 1},
+                },
+            },
+        )
+
+    def test_ratings(self):
+        # player 3 beats player 1, who beats player 2
+        self.g1.finish(0, datetime.now())
+        self.g2.finish(1, datetime.now())
+        ratings, strengths = rate(self.e1.game_set.all())
+
+        self.assertEqual(
+            [rating["player"] for rating in ratings],
+            ["player 3", "player 1", "player 2"],
+        )
+        self.assertEqual([rating["games"] for rating in ratings], [1, 2, 1])
+        for rating in ratings:
+            self.assertLess(rating["low"], rating["rating"])
+            self.assertLess(rating["rating"], rating["high"])
+
+        # Starting from the last fit gives the same ratings
+        self.assertEqual(rate(self.e1.game_set.all(), strengths)[0], ratings)
+
+    def test_claim_game_for(self):
+        # Each claim gets a different game, until there are none left
+        games = {self.e1.claim_game_for(self.u1), self.e1.claim_game_for(self.u1)}
+        self.assertEqual(games, {self.g1, self.g2})
+        self.assertIsNone(self.e1.claim_game_for(self.u1))
+
+        # Unless a claim goes stale
+        Turn.objects.filter(game=self.g1).update(
+            claimed=datetime.now() - settings.SOFTSERVE_CLAIM_TIMEOUT * 2
+        )
+        self.assertEqual(self.e1.claim_game_for(self.u1), self.g1)
+
+    def test_claim_retry(self):
+        client = TestClient(app)
+
+        def play_state(client_id):
+            return client.post(
+                "/aivai/play-state",
+                json={
+                    "event": self.e1.name,
+                    "player": self.u1.username,
+                    "token": self.password,
+                    "client": client_id,
+                },
+            )
+
+        # A client whose response was lost gets the same game and action again
+        first = play_state("a").json()
+        retry = play_state("a").json()
+        self.assertEqual(retry["game_id"], first["game_id"])
+        self.assertEqual(retry["action_id"], first["action_id"])
+
+        # While other clients get other games
+        other = play_state("b").json()
+        self.assertNotEqual(other["game_id"], first["game_id"])
+        self.assertEqual(play_state("c").status_code, 204)
+
+    def test_stored_legal_actions(self):
+        client = TestClient(app)
+        r = client.post(
+            "/aivai/play-state",
+            json={"event": self.e1.name, "player": "player 1", "token": "test"},
+        )
+        action = Action.objects.get(pk=r.json()["action_id"])
+
+        # Worked out in the background
+        for _ in range(100):
+            action.refresh_from_db()
+            if action.legal_actions is not None:
+                break
+            sleep(0.05)
+        legal_actions = util.get_actions(action.before_state)[0]
+        self.assertEqual(action.legal_actions, legal_actions)
+
+        # And checked against on submit
+        Action.objects.filter(pk=action.id).update(legal_actions=legal_actions[1:])
+        submit = {
+            "player": "player 1",
+            "token": "test",
+            "action": legal_actions[0],
+            "action_id": action.id,
+        }
+        r = client.post("/aivai/submit-action", json=submit)
+        self.assertEqual(r.status_code, 422)
+
+        Action.objects.filter(pk=action.id).update(legal_actions=legal_actions)
+        r = client.post("/aivai/submit-action", json=submit)
+        self.assertEqual(r.status_code, 200)
+
+    def test_states_stored_once(self):
+        initial = settings.SOFTSERVE_INITIAL_STATE
+        self.assertEqual(self.g1.initial_id, self.g2.initial_id)
+
+        after = "1,-2|1,-1|0,-1|0,0|t"
+        for game in [self.g1, self.g2]:
+            action = game.next_action()
+            action.after_state = after
+            action.save()
+
+        action = Action.objects.get(pk=action.pk)
+        self.assertEqual(action.before_state, initial)
+        self.assertEqual(action.after_state, after)
+        self.assertEqual(Game.objects.get(pk=self.g2.pk).initial_state, initial)
+        self.assertEqual(State.objects.filter(text__in=[initial, after]).count(), 2)
+
+    def test_admin_change_forms(self):
+        User.objects.create_superuser("admin", password="admin")
+        self.client.login(username="admin", password="admin")
+        action = self.g1.next_action()
+
+        # States and actions are far too many to list in selects
+        for url, field in [
+            (f"/admin/softserve/game/{self.g1.pk}/change/", "current"),
+            (f"/admin/softserve/action/{action.pk}/change/", "before"),
+        ]:
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            self.assertNotContains(r, f'<select name="{field}"')
+            self.assertContains(r, f'name="{field}"')
+
+    def test_rebuild_standings(self):
+        self.g1.finish(0, datetime.now())
+        self.g2.forfeit = self.g2.player_set.get(number=1)
+        self.g2.save(update_fields=["forfeit"])
+        self.g2.finish(None, datetime.now())
+
+        def standings():
+            return list(
+                Standing.objects.order_by("event", "user", "forfeits").values(
+                    "event", "user", "forfeits", *Standing.COUNTS
+                )
+            )
+
+        expected = (standings(), list(GameResult.objects.order_by("game").values()))
+        Standing.objects.update(wins=100)
+        GameResult.objects.update(result="ongoing")
+
+        call_command("rebuild_standings", stdout=StringIO())
+        self.assertEqual(
+            (standings(), list(GameResult.objects.order_by("game").values())), expected
+        )
+
+    def test_rebuild_standings_while_games_finish(self):
+        def standings():
+            return list(
+                Standing.objects.order_by("event", "user", "forfeits").values(
+                    "event", "user", "forfeits", *Standing.COUNTS
+                )
+            )
+
+        tallied = ThreadEvent()
+        tally_games = rebuild_standings.tally_games
+
+        def tally_slowly(games):
+            tally = tally_games(games)
+            tallied.set()
+            sleep(0.5)
+            return tally
+
+        def finish():
+            tallied.wait()
+            try:
+                Game.objects.get(pk=self.g1.pk).finish(0, datetime.now())
+            finally:
+                connection.close()
+
+        finishing = Thread(target=finish)
+        finishing.start()
+        with patch.object(rebuild_standings, "tally_games", tally_slowly):
+            rebuild_standings.rebuild(self.e1)
+        finishing.join()
+
+        # The game finished after the rebuild, and counts
+        live = standings()
+        self.assertEqual(GameResult.objects.get(game=self.g1).result, "x win")
+        rebuild_standings.rebuild(self.e1)
+        self.assertEqual(standings(), live)
+
+    def test_forfeit(self):
+        action = self.g1.next_action()
+        action.notation = "1,-2|1,-1|0,-1|0,0"
+        action.after_state = "1,-2|1,-1|0,-1|0,0|t"
+        action.submit_timestamp = datetime.now()
+        action.save()
+        self.assertIsNone(self.g1.forfeit)
+
+        # u2 takes too long
+        action = self.g1.next_action()
+        action.notation = "1,-2|1,-1|0,-1|0,0"
+        action.after_state = "1,-2|1,-1|0,-1|0,0|h"
+        action.submit_timestamp = (
+            action.create_timestamp + settings.SOFTSERVE_THINK_TIME * 2
+        )
+        action.save()
+
+        game = Game.objects.get(pk=self.g1.pk)
+        self.assertEqual(game.forfeit.user, self.u2)
+        self.assertEqual(game.forfeit_time, settings.SOFTSERVE_THINK_TIME * 2)
+        self.assertEqual(list(self.e1.game_set.exclude(forfeit=None)), [game])
+
 
 class CreeperTestCase(APITestCase):
     def test_threefold_repetition_draws(self):
@@ -422,3 +810,428 @@ class CreeperTestCase(APITestCase):
         self.assertEqual(r.status_code, 200)
         # First game should have ended in a draw, so we should have a new game
         self.assertEqual(Game.objects.count(), 2)
+
+
+class CircuitBreakerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.stats = Counter()
+        self.breaker = CircuitBreaker(2, 60, self.stats)
+
+    def crash(self):
+        with self.assertRaises(EngineCrash):
+            with self.breaker.guard():
+                raise EngineCrash()
+
+    def test_opens_after_consecutive_failures(self):
+        self.crash()
+        with self.breaker.guard():
+            pass
+        self.crash()
+        self.assertIsNone(self.breaker.opened)
+
+        self.crash()
+        with self.assertRaises(EngineUnavailable):
+            with self.breaker.guard():
+                pass
+        self.assertEqual(self.stats["breaker_trips"], 1)
+        self.assertEqual(self.stats["fast_failures"], 1)
+
+    def test_trial_call(self):
+        self.breaker.cooldown = 0
+        self.crash()
+        self.crash()
+
+        # Only one trial at a time, and its success closes the breaker
+        with self.breaker.guard():
+            with self.assertRaises(EngineUnavailable):
+                self.breaker.check()
+        self.assertIsNone(self.breaker.opened)
+
+    def test_trial_ended_by_other_errors(self):
+        self.breaker.cooldown = 0
+        self.crash()
+        self.crash()
+
+        with self.assertRaises(OSError):
+            with self.breaker.guard():
+                raise OSError()
+        self.assertFalse(self.breaker.trial)
+
+        # So another trial can go ahead
+        self.crash()
+        self.assertIsNotNone(self.breaker.opened)
+
+
+class LimitTestCase(SimpleTestCase):
+    def test_limit(self):
+        with Popen(["sleep", "10"]) as p:
+            limit(p.pid, 5, 2**30)
+            self.assertEqual(resource.prlimit(p.pid, resource.RLIMIT_CPU), (5, 5))
+            self.assertEqual(
+                resource.prlimit(p.pid, resource.RLIMIT_AS), (2**30, 2**30)
+            )
+            p.kill()
+
+        # Too late to limit, but that's fine
+        limit(p.pid, 5)
+
+
+class AdmissionControlTestCase(SimpleTestCase):
+    def test_refused_when_none_may_wait(self):
+        admission = AdmissionControl(1, 0)
+        admission.acquire(STATE)
+        with self.assertRaises(EngineBusy):
+            admission.acquire(SUBMIT)
+
+        admission.release()
+        admission.acquire(STATE)
+
+    def test_priority_and_shedding(self):
+        admitted = []
+
+        async def call(admission, priority, name):
+            try:
+                await admission.acquire_async(priority)
+            except EngineBusy:
+                admitted.append(f"{name} shed")
+                return
+            admitted.append(name)
+            admission.release()
+
+        async def run():
+            admission = AdmissionControl(1, 2)
+            admission.acquire(STATE)
+            tasks = []
+            for priority, name in [(THINK, "think"), (STATE, "state")]:
+                tasks.append(asyncio.create_task(call(admission, priority, name)))
+                await asyncio.sleep(0)
+            # The queue is full, so this displaces the think call
+            tasks.append(asyncio.create_task(call(admission, SUBMIT, "submit")))
+            await asyncio.sleep(0)
+
+            admission.release()
+            await asyncio.gather(*tasks)
+            self.assertEqual(admission.running, 0)
+
+        asyncio.run(run())
+        self.assertEqual(admitted, ["think shed", "submit", "state"])
+
+    def test_cancelled_waiter_leaves_queue(self):
+        async def run():
+            admission = AdmissionControl(1, 1)
+            admission.acquire(STATE)
+            task = asyncio.create_task(admission.acquire_async(STATE))
+            await asyncio.sleep(0)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            self.assertEqual(admission.waiting, [])
+
+            admission.release()
+            self.assertEqual(admission.running, 0)
+
+        asyncio.run(run())
+
+    def test_background_priority(self):
+        future = util.in_background(SUBMIT, util.current_priority.get)
+        self.assertEqual(future.result(), SUBMIT)
+
+    def test_background_work_leaves_admitted_work_a_thread(self):
+        admission = AdmissionControl(1, 10)
+        executor = ThreadPoolExecutor(1)
+
+        async def run():
+            # A sync call holds the only slot, and an async one waits for it
+            admission.acquire(STATE)
+            util.current_priority.set(SUBMIT)
+            waiting = asyncio.create_task(util.engine_async("-I"))
+            await asyncio.sleep(0.1)
+            # Then background work queues up behind it
+            background = util.in_background(STATE, util.engine, "-I")
+            await asyncio.sleep(0.1)
+
+            admission.release()
+            await asyncio.wait_for(waiting, 5)
+            background.result(5)
+
+        with patch.object(util, "admission", admission), patch.object(
+            util, "_executor", executor
+        ):
+            asyncio.run(run())
+        self.assertEqual(admission.running, 0)
+
+    def test_async_engine_calls_are_admitted(self):
+        with patch.object(util, "admission", AdmissionControl(0, 0)):
+            with self.assertRaises(HTTPException) as cm:
+                asyncio.run(util.engine_async("-I"))
+        self.assertEqual(cm.exception.status_code, 503)
+
+
+class LRUCacheTestCase(SimpleTestCase):
+    def test_least_recently_used_evicted(self):
+        lru = LRUCache(2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        self.assertEqual(lru.get("a"), 1)
+        lru.set("c", 3)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("a"), 1)
+        self.assertEqual(lru.get("c"), 3)
+        self.assertEqual(len(lru), 2)
+
+    def test_timeout(self):
+        lru = LRUCache(2, timeout=60)
+        with patch("softserve.api.cache.monotonic", return_value=0):
+            lru.set("a", 1)
+        with patch("softserve.api.cache.monotonic", return_value=59):
+            self.assertEqual(lru.get("a"), 1)
+        with patch("softserve.api.cache.monotonic", return_value=61):
+            self.assertIsNone(lru.get("a"))
+        self.assertEqual(len(lru), 0)
+
+
+class EngineCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.engine = NamedTemporaryFile()
+        self.engine.write(b"v1")
+        self.engine.flush()
+        self.changes = 0
+        self.cache = EngineCache(self.engine.name, 10, 60, on_change=self.changed)
+        self.cache.CHECK_INTERVAL = 0
+
+    def tearDown(self):
+        self.engine.close()
+
+    def changed(self):
+        self.changes += 1
+
+    def test_tiers(self):
+        self.assertIsNone(self.cache.get(["-I"]))
+        self.cache.set(["-I"], "result")
+        self.assertEqual(self.cache.get(["-I"]), "result")
+
+        # Another process only has the shared cache
+        self.cache.local.clear()
+        self.assertEqual(self.cache.get(["-I"]), "result")
+        self.assertEqual(self.cache.get(["-I"]), "result")
+        self.assertEqual(
+            self.cache.stats, Counter(misses=1, shared_hits=1, local_hits=2)
+        )
+
+    def test_engine_replaced(self):
+        self.cache.set(["-I"], "result")
+        self.engine.write(b"v2")
+        self.engine.flush()
+
+        self.assertIsNone(self.cache.get(["-I"]))
+        self.assertEqual(len(self.cache.local), 0)
+        self.assertEqual(self.changes, 1)
+        self.assertEqual(self.cache.stats["invalidations"], 1)
+
+
+class GatedScheduler(ThinkScheduler):
+    """Jobs think until they are let go"""
+
+    async def think(self, job):
+        job.gate = asyncio.Event()
+        await job.gate.wait()
+        job.result = {"action": "pass", "iterations": job.iterations}
+        job.status = DONE
+
+
+class ThinkSchedulerTestCase(SimpleTestCase):
+    def test_budget_first_come_first_served(self):
+        async def run():
+            scheduler = GatedScheduler(4, 10)
+            big = scheduler.submit("state1", 3, 1000)
+            bigger = scheduler.submit("state2", 2, 1000)
+            # Would fit, but waits its turn
+            small = scheduler.submit("state3", 1, 1000)
+            await asyncio.sleep(0)
+            self.assertEqual([big.status, bigger.status], [RUNNING, QUEUED])
+            self.assertEqual(scheduler.position(small), 1)
+            self.assertEqual(scheduler.in_use, 3)
+
+            big.gate.set()
+            await scheduler.wait(big)
+            await asyncio.sleep(0)
+            self.assertEqual([bigger.status, small.status], [RUNNING, RUNNING])
+            self.assertEqual(scheduler.in_use, 3)
+
+            bigger.gate.set()
+            small.gate.set()
+            await asyncio.gather(scheduler.wait(bigger), scheduler.wait(small))
+            self.assertEqual(scheduler.in_use, 0)
+
+        asyncio.run(run())
+
+    def test_too_big_for_budget(self):
+        async def run():
+            scheduler = GatedScheduler(2, 10)
+            job = scheduler.submit("state", 4, 1000)
+            self.assertEqual(job.workers, 2)
+            self.assertEqual(job.status, RUNNING)
+            await asyncio.sleep(0)
+            job.gate.set()
+            await scheduler.wait(job)
+
+        asyncio.run(run())
+
+    def test_cancel_queued(self):
+        async def run():
+            scheduler = GatedScheduler(1, 10)
+            running = scheduler.submit("state1", 1, 1000)
+            queued = scheduler.submit("state2", 1, 1000)
+            self.assertFalse(scheduler.full)
+            scheduler.cancel(queued)
+            self.assertEqual(queued.status, CANCELLED)
+            self.assertTrue(queued.done.is_set())
+            self.assertEqual(scheduler.queue, [])
+
+            await asyncio.sleep(0)
+            running.gate.set()
+            await scheduler.wait(running)
+            self.assertEqual(scheduler.in_use, 0)
+
+        asyncio.run(run())
+
+    def test_forget_oldest_finished(self):
+        async def run():
+            scheduler = GatedScheduler(1, 10, max_finished=1)
+            running = scheduler.submit("state1", 1, 1000)
+            first = scheduler.submit("state2", 1, 1000)
+            second = scheduler.submit("state3", 1, 1000)
+            scheduler.cancel(first)
+            scheduler.cancel(second)
+            self.assertIsNone(scheduler.get(first.id))
+            self.assertIs(scheduler.get(second.id), second)
+
+            await asyncio.sleep(0)
+            running.gate.set()
+            await scheduler.wait(running)
+
+        asyncio.run(run())
+
+    def test_results_reused_if_deep_enough(self):
+        async def run():
+            scheduler = ThinkScheduler(1, 10)
+            state, _ = engine("-I")
+            job = scheduler.submit(state.strip(), 1, 2000)
+            await scheduler.wait(job)
+            self.assertEqual(job.status, DONE)
+            self.assertFalse(job.result["cached"])
+
+            shallower = scheduler.submit(state.strip(), 1, 1000)
+            self.assertEqual(shallower.status, DONE)
+            self.assertTrue(shallower.result["cached"])
+            self.assertEqual(shallower.result["action"], job.result["action"])
+
+            deeper = scheduler.submit(state.strip(), 1, 4000)
+            self.assertEqual(deeper.status, RUNNING)
+            await scheduler.wait(deeper)
+            self.assertFalse(deeper.result["cached"])
+
+        asyncio.run(run())
+
+    def test_cancel_while_applying_action(self):
+        async def run():
+            applying = asyncio.Event()
+            applied = asyncio.Event()
+
+            async def apply_action_async(state, action):
+                applying.set()
+                await applied.wait()
+                return util.ActionResult(True, state, "", [], "")
+
+            scheduler = ThinkScheduler(1, 10)
+            state, _ = engine("-I")
+            with patch("softserve.api.jobs.apply_action_async", apply_action_async):
+                job = scheduler.submit(state.strip(), 1, 1000)
+                await applying.wait()
+                scheduler.cancel(job)
+                applied.set()
+                await scheduler.wait(job)
+
+            self.assertEqual(job.status, CANCELLED)
+            self.assertIsNone(job.result)
+
+        asyncio.run(run())
+
+    def test_one_process_runs_jobs(self):
+        async def run(lock):
+            scheduler = GatedScheduler(1, 10, lock_path=lock)
+            job = scheduler.submit("state", 1, 1000)
+
+            # Another process, as far as the lock is concerned
+            with self.assertRaises(ThinkUnavailable):
+                GatedScheduler(1, 10, lock_path=lock).submit("state", 1, 1000)
+
+            await asyncio.sleep(0)
+            job.gate.set()
+            await scheduler.wait(job)
+            scheduler.lock_file.close()
+
+        with NamedTemporaryFile() as lock:
+            asyncio.run(run(lock.name))
+
+
+# A stand-in for the engine's serve mode: "echo" prints its arguments, "crash"
+# exits and "hang" never answers
+SERVE_MODE = """
+import json, sys, time
+for line in sys.stdin:
+    results = []
+    for command in json.loads(line):
+        command = [
+            results[arg["ref"]]["stdout"].strip() if isinstance(arg, dict) else arg
+            for arg in command
+        ]
+        if command[0] == "crash":
+            sys.exit(1)
+        if command[0] == "hang":
+            time.sleep(60)
+        results.append({"status": 0, "stdout": " ".join(command[1:]) + "\\n", "stderr": ""})
+    print(json.dumps(results), flush=True)
+"""
+
+
+class EnginePoolTestCase(SimpleTestCase):
+    def setUp(self):
+        self.pool = EnginePool([sys.executable, "-c", SERVE_MODE], 1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_request(self):
+        results = self.pool.request([["echo", "a"], ["echo", {"ref": 0}, "b"]])
+        self.assertEqual([result["stdout"] for result in results], ["a\n", "a b\n"])
+        # The worker is kept for the next request
+        self.assertEqual(len(self.pool.idle), 1)
+
+    def test_crash_replaced(self):
+        self.pool.request([["echo"]])
+        with self.assertRaises(EngineWorkerError):
+            self.pool.request([["crash"]])
+        self.assertEqual(self.pool.started, 0)
+        self.assertEqual(self.pool.request([["echo", "a"]])[0]["stdout"], "a\n")
+
+    def test_timeout(self):
+        with self.assertRaises(EngineWorkerTimeout):
+            self.pool.request([["hang"]], timeout=0.1)
+        self.assertEqual(self.pool.started, 0)
+        self.assertEqual(self.pool.request([["echo", "a"]])[0]["stdout"], "a\n")
+
+    def test_checkout_waits_for_discard(self):
+        worker = self.pool.checkout()
+        results = []
+        waiting = Thread(
+            target=lambda: results.append(self.pool.request([["echo"]])), daemon=True
+        )
+        waiting.start()
+        waiting.join(0.1)
+        self.assertTrue(waiting.is_alive())
+
+        # Discarding the busy worker makes room for another
+        self.pool.discard(worker)
+        waiting.join(5)
+        self.assertFalse(waiting.is_alive())
+        self.assertEqual(len(results), 1)
@@ -0,0 +1,24 @@
+"""Live updates for event dashboards
+
+Updates are published to a Redis channel per event, as JSON. Each API
+process subscribes to the channels of the events it has viewers for (see
+api/broadcast.py), so publishing costs the same however many are watching.
+"""
+
+import json
+
+from django.conf import settings
+from redis import Redis
+
+redis = None
+
+
+def channel(event_id):
+    return f"softserve:event:{event_id}"
+
+
+def publish(event_id, update):
+    global redis
+    if redis is None:
+        redis = Redis.from_url(settings.SOFTSERVE_REDIS_URL)
+    redis.publish(channel(event_id), json.dumps(update))